@@ -1,5 +1,5 @@
 import os
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from pymongo import MongoClient
@@ -27,6 +27,10 @@ def create_app(config_name='default'):
     # Load configuration
     app.config.from_object(config[config_name])
     
+    # Encode ObjectId and datetime natively in every JSON response
+    from utils.json_provider import OrjsonProvider
+    app.json = OrjsonProvider(app)
+    
     # Initialize CORS
     CORS(app, 
          resources={r"/api/*": {"origins": "*"}},
@@ -36,6 +40,22 @@ def create_app(config_name='default'):
     
     # Initialize JWT
     jwt = JWTManager(app)
+    from utils.auth_claims import register_jwt_callbacks, authz_versions
+    register_jwt_callbacks(jwt)
+    
+    # Size the process-level user cache
+    from utils.user_cache import user_cache
+    user_cache.configure(app.config['USER_CACHE_MAX_SIZE'], app.config['USER_CACHE_TTL'])
+    
+    # Bound password hashing and shed load when the pool is saturated
+    from utils.passwords import password_hasher, PasswordPoolBusy
+    password_hasher.configure(app.config['BCRYPT_ROUNDS'],
+                              app.config['PASSWORD_HASH_WORKERS'],
+                              app.config['PASSWORD_HASH_MAX_PENDING'])
+    
+    @app.errorhandler(PasswordPoolBusy)
+    def password_pool_busy(e):
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     
     # Initialize MongoDB connection with error handling
     try:
@@ -45,25 +65,109 @@ def create_app(config_name='default'):
         client.server_info()
         db = client.get_default_database()
         app.db = db  # Also attach to app for compatibility
+        if app.config['JWT_PERMISSION_CLAIMS']:
+            authz_versions.load(db.users, app.config['USER_CACHE_TTL'])
     except Exception as e:
         print(f"Failed to connect to MongoDB: {str(e)}")
         raise
     
+    # Reconcile declared indexes without blocking startup
+    if app.config['ENSURE_INDEXES']:
+        from utils.indexes import reconcile_indexes_async
+        from models.task import Task
+        from models.user import User
+        from models.report import Report
+        from models.archive import ArchiveModel
+        from models.comment import Comment
+        from models.task_history import TaskHistory
+        from models.attachment import Attachment
+        from models.dashboard import DashboardCounters
+        reconcile_indexes_async(db, {
+            'tasks': Task.INDEXES,
+            'users': User.INDEXES,
+            'reports': Report.INDEXES,
+            'comments': Comment.INDEXES,
+            'task_history': TaskHistory.INDEXES,
+            'attachments': Attachment.INDEXES,
+            'attachment_chunks': Attachment.CHUNK_INDEXES,
+            'counters': DashboardCounters.INDEXES,
+            **ArchiveModel(db).index_registry()
+        })
+    
+    # Flag tasks overdue as their due dates pass
+    if app.config['DUE_DATE_SCHEDULER']:
+        from utils.due_dates import due_date_scheduler
+        due_date_scheduler.start(db.tasks, app.config['DUE_DATE_RESYNC_INTERVAL'])
+    
+    # Repair drift in the incrementally maintained dashboard counters
+    if app.config['DASHBOARD_RECONCILE_INTERVAL'] > 0:
+        from utils.periodic import run_periodically
+        from models.dashboard import DashboardCounters
+        run_periodically('dashboard-reconcile', app.config['DASHBOARD_RECONCILE_INTERVAL'],
+                         DashboardCounters(db).reconcile)
+    
+    # Collect chunks left behind by expired or replaced uploads
+    if app.config['ATTACHMENT_SWEEP_INTERVAL'] > 0:
+        from utils.periodic import run_periodically
+        from models.attachment import Attachment
+        run_periodically('attachment-sweep', app.config['ATTACHMENT_SWEEP_INTERVAL'],
+                         Attachment(db).sweep_chunks, run_first=False)
+    
+    # Archive tasks matched by the retention policies; `flask archive run` does the same on demand
+    from jobs.archival import ArchivalJob, archive_cli
+    app.cli.add_command(archive_cli)
+    if app.config['ARCHIVE_JOB_INTERVAL'] > 0:
+        from utils.periodic import run_periodically
+        archival_job = ArchivalJob(db, app.config['ARCHIVE_BATCH_SIZE'], app.config['ARCHIVE_MAX_OPS_PER_SEC'])
+        run_periodically('archival-job', app.config['ARCHIVE_JOB_INTERVAL'], archival_job.run, run_first=False)
+    
+    # Serve full reads of cold archive entries from local segment files
+    from utils.segments import archive_segments
+    from jobs.cold_tier import ColdTierExporter
+    archive_segments.configure(app.config['ARCHIVE_SEGMENT_DIR'])
+    if app.config['COLD_TIER_INTERVAL'] > 0:
+        from utils.periodic import run_periodically
+        exporter = ColdTierExporter(db, app.config['COLD_TIER_AFTER_DAYS'])
+        run_periodically('cold-tier-export', app.config['COLD_TIER_INTERVAL'], exporter.run, run_first=False)
+    
+    # Retention drops whole monthly archive partitions
+    if app.config['ARCHIVE_RETENTION_DAYS'] > 0:
+        from datetime import datetime, timedelta
+        from utils.periodic import run_periodically
+        from models.archive import ArchiveModel
+        retention = timedelta(days=app.config['ARCHIVE_RETENTION_DAYS'])
+        run_periodically('archive-retention', 24 * 3600,
+                         lambda: ArchiveModel(db).drop_archived_before(datetime.utcnow() - retention))
+    
+    # Share task change events between processes when configured
+    if app.config['TASK_EVENTS_BROKER'] == 'mongo':
+        from utils.events import task_events, MongoBroker
+        task_events.set_broker(MongoBroker(db))
+    
     # Register blueprints
     from routes.auth import auth_bp
     from routes.tasks import tasks_bp
     from routes.users import users_bp
     from routes.reports import reports_bp
+    from routes.attachments import attachments_bp
+    from routes.dashboard import dashboard_bp
+    from routes.archives import archives_bp
     
     # Attach db to blueprints
     auth_bp.db = db
     tasks_bp.db = db
     users_bp.db = db
     reports_bp.db = db
+    attachments_bp.db = db
+    dashboard_bp.db = db
+    archives_bp.db = db
     
     app.register_blueprint(auth_bp)  # URL prefix is defined in blueprint
     app.register_blueprint(tasks_bp)  # URL prefix is defined in blueprint
     app.register_blueprint(users_bp, url_prefix='/api/users')
     app.register_blueprint(reports_bp)  # URL prefix is defined in blueprint
+    app.register_blueprint(attachments_bp)  # URL prefix is defined in blueprint
+    app.register_blueprint(dashboard_bp)  # URL prefix is defined in blueprint
+    app.register_blueprint(archives_bp)  # URL prefix is defined in blueprint
     
     return app
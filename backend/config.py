@@ -9,10 +9,58 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # Embed department/roles/permissions in access tokens so authorization skips MongoDB
+    JWT_PERMISSION_CLAIMS = os.getenv('JWT_PERMISSION_CLAIMS', 'false').lower() == 'true'
     
     # MongoDB Configuration
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/archival_db')
     
+    # Create missing MongoDB indexes in the background at startup
+    ENSURE_INDEXES = os.getenv('ENSURE_INDEXES', 'true').lower() == 'true'
+    
+    # Password hashing (bcrypt cost factor and worker pool limits)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+    
+    # Rows per insert_many batch in the bulk user import
+    USER_IMPORT_BATCH_SIZE = int(os.getenv('USER_IMPORT_BATCH_SIZE', 500))
+    
+    # Attachment storage: chunk size for new uploads and the largest file accepted
+    ATTACHMENT_CHUNK_SIZE = int(os.getenv('ATTACHMENT_CHUNK_SIZE', 1024 * 1024))
+    ATTACHMENT_MAX_SIZE = int(os.getenv('ATTACHMENT_MAX_SIZE', 2 * 1024 ** 3))
+    # Delete chunks no file or pending upload references this often (0 disables)
+    ATTACHMENT_SWEEP_INTERVAL = int(os.getenv('ATTACHMENT_SWEEP_INTERVAL', 3600))  # seconds
+    
+    # Background scheduler that flags tasks overdue; resync picks up other processes' writes
+    DUE_DATE_SCHEDULER = os.getenv('DUE_DATE_SCHEDULER', 'true').lower() == 'true'
+    DUE_DATE_RESYNC_INTERVAL = int(os.getenv('DUE_DATE_RESYNC_INTERVAL', 900))  # seconds
+    
+    # Recount dashboard counters from tasks/users this often (0 disables)
+    DASHBOARD_RECONCILE_INTERVAL = int(os.getenv('DASHBOARD_RECONCILE_INTERVAL', 3600))  # seconds
+    
+    # Broker behind the task event stream: 'local' for one process, 'mongo' to share across processes
+    TASK_EVENTS_BROKER = os.getenv('TASK_EVENTS_BROKER', 'local')
+    
+    # Policy-driven archival job: run every ARCHIVE_JOB_INTERVAL seconds in-process (0 disables),
+    # moving ARCHIVE_BATCH_SIZE tasks per bulk write and at most ARCHIVE_MAX_OPS_PER_SEC tasks a second
+    ARCHIVE_JOB_INTERVAL = int(os.getenv('ARCHIVE_JOB_INTERVAL', 0))  # seconds
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_MAX_OPS_PER_SEC = int(os.getenv('ARCHIVE_MAX_OPS_PER_SEC', 1000))
+    
+    # Cold tier: archive entries older than COLD_TIER_AFTER_DAYS move to segment files under
+    # ARCHIVE_SEGMENT_DIR, leaving stubs in MongoDB; exported every COLD_TIER_INTERVAL seconds (0 disables)
+    ARCHIVE_SEGMENT_DIR = os.getenv('ARCHIVE_SEGMENT_DIR', 'archive_segments')
+    COLD_TIER_AFTER_DAYS = int(os.getenv('COLD_TIER_AFTER_DAYS', 365))
+    COLD_TIER_INTERVAL = int(os.getenv('COLD_TIER_INTERVAL', 0))  # seconds
+    
+    # Drop archive partitions (and their cold segments) older than this many days, checked daily (0 keeps all)
+    ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', 0))
+    
+    # Authenticated user cache and token authz_version table (per process; TTL bounds staleness across processes)
+    USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # seconds
+    
     # Google Calendar API Configuration
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
@@ -0,0 +1 @@
+# Background jobs, runnable in-process or from the flask CLI
@@ -0,0 +1,166 @@
+import logging
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import ASCENDING
+from jobs.lease import JobLease
+from models.archive import ArchiveModel
+from models.archive_policy import ArchivePolicy
+from models.task import Task
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivalJob:
+    """Moves tasks matched by the retention policies into the archive, in batches.
+
+    Each run snapshots the policies into (department, status, cutoff) units
+    and walks every unit along the department_status_updated_at index with a
+    keyset cursor. The cursor position is checkpointed after each batch, so a
+    run that crashes is resumed from its last batch by the next one. A lease
+    on the checkpoint keeps two processes from running the job at once.
+    """
+
+    CHECKPOINT_ID = 'archival'
+
+    def __init__(self, db, batch_size=500, max_ops_per_sec=1000, archived_by='system'):
+        self.db = db
+        self.lease = JobLease(db, self.CHECKPOINT_ID)
+        self.batch_size = batch_size
+        self.max_ops_per_sec = max_ops_per_sec
+        self.archived_by = archived_by
+
+    def _start(self, now):
+        departments = [d for d in self.db.tasks.distinct('department') if d is not None]
+        units = [
+            {'department': department, 'status': status, 'cutoff': cutoff, 'after': None, 'done': False}
+            for department, status, cutoff in ArchivePolicy(self.db).resolve(departments, now)
+        ]
+        self.lease.save({'$set': {'state': 'running', 'units': units, 'archived': 0,
+                             'started_at': now, 'finished_at': None}})
+        return units
+
+    def _next_batch(self, unit):
+        query = {'department': unit['department'], 'status': unit['status'],
+                 'updated_at': {'$lt': unit['cutoff']}}
+        after = unit['after']
+        if after:
+            # Tasks left behind by a version conflict are skipped, not retried forever
+            query['$or'] = [{'updated_at': {'$gt': after['updated_at']}},
+                            {'updated_at': after['updated_at'], '_id': {'$gt': after['_id']}}]
+        cursor = self.db.tasks.find(query).sort([('updated_at', ASCENDING), ('_id', ASCENDING)])
+        return list(cursor.limit(self.batch_size))
+
+    def _throttle(self, started, ops):
+        if self.max_ops_per_sec > 0:
+            remaining = ops / self.max_ops_per_sec - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def run(self, max_batches=None):
+        """Archive until every unit is exhausted or max_batches have run.
+
+        Returns the number of tasks archived by this call, or None when
+        another process holds the job.
+        """
+        now = datetime.utcnow()
+        checkpoint = self.lease.acquire(now)
+        if checkpoint is None:
+            logger.info('Archival job is already running elsewhere')
+            return None
+
+        if checkpoint.get('state') == 'running':
+            units = checkpoint['units']
+            logger.info(f"Resuming archival run started at {checkpoint['started_at']}")
+        else:
+            units = self._start(now)
+
+        try:
+            archived = self._run_units(units, max_batches)
+        finally:
+            self.lease.release()
+        logger.info(f'Archival job archived {archived} tasks')
+        return archived
+
+    def _run_units(self, units, max_batches):
+        archive_model = ArchiveModel(self.db)
+        task_model = Task(self.db)
+        archived = 0
+        batches = 0
+        for index, unit in enumerate(units):
+            while not unit['done']:
+                if max_batches is not None and batches >= max_batches:
+                    return archived
+                started = time.monotonic()
+                batch = self._next_batch(unit)
+                moved = archive_model.archive_tasks(batch, self.archived_by)
+                task_model.record_archived(moved)
+                archived += len(moved)
+                if batch:
+                    unit['after'] = {'updated_at': batch[-1]['updated_at'], '_id': batch[-1]['_id']}
+                unit['done'] = len(batch) < self.batch_size
+                batches += 1
+                if not self.lease.save({'$set': {f'units.{index}.after': unit['after'],
+                                            f'units.{index}.done': unit['done']},
+                                   '$inc': {'archived': len(moved)}}):
+                    logger.warning('Archival job lost its lease; stopping')
+                    return archived
+                self._throttle(started, len(batch))
+
+        self.lease.save({'$set': {'state': 'idle', 'finished_at': datetime.utcnow()}})
+        return archived
+
+
+archive_cli = AppGroup('archive', help='Retention policies and the batch archival job.')
+
+
+@archive_cli.command('run')
+@click.option('--batch-size', type=int, help='Tasks per batch (default ARCHIVE_BATCH_SIZE).')
+@click.option('--max-ops', type=int, help='Tasks archived per second at most (default ARCHIVE_MAX_OPS_PER_SEC).')
+@click.option('--max-batches', type=int, help='Stop after this many batches; the next run resumes.')
+def run_command(batch_size, max_ops, max_batches):
+    """Archive every task matched by a retention policy."""
+    job = ArchivalJob(current_app.db,
+                      batch_size or current_app.config['ARCHIVE_BATCH_SIZE'],
+                      max_ops or current_app.config['ARCHIVE_MAX_OPS_PER_SEC'])
+    archived = job.run(max_batches)
+    if archived is None:
+        raise click.ClickException('Archival job is already running in another process')
+    click.echo(f'Archived {archived} tasks')
+
+
+@archive_cli.command('policies')
+def list_policies_command():
+    """List the retention policies."""
+    for policy in ArchivePolicy(current_app.db).get_policies():
+        click.echo(f"{policy['_id']}: {', '.join(policy['statuses'])} older than {policy['age_days']} days")
+
+
+@archive_cli.command('set-policy')
+@click.argument('department')
+@click.argument('age_days', type=int)
+@click.option('--status', 'statuses', multiple=True, help='Status to archive (repeatable, default done).')
+def set_policy_command(department, age_days, statuses):
+    """Archive DEPARTMENT's tasks untouched for AGE_DAYS days ('*' for the default)."""
+    try:
+        ArchivePolicy(current_app.db).set_policy(department, age_days, statuses)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+@archive_cli.command('delete-policy')
+@click.argument('department')
+def delete_policy_command(department):
+    """Remove DEPARTMENT's retention policy."""
+    if not ArchivePolicy(current_app.db).delete_policy(department):
+        raise click.ClickException(f'No policy for {department}')
+
+
+@archive_cli.command('drop-before')
+@click.argument('month', type=click.DateTime(['%Y-%m']))
+def drop_before_command(month):
+    """Permanently drop archive entries from months before MONTH (YYYY-MM)."""
+    months = ArchiveModel(current_app.db).drop_archived_before(month)
+    click.echo(f"Dropped {len(months)} archive partitions {' '.join(m.strftime('%Y-%m') for m in months)}")
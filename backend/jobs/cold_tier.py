@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from models.archive import ArchiveModel
+from jobs.archival import archive_cli
+from jobs.lease import JobLease
+from utils.segments import archive_segments
+
+logger = logging.getLogger(__name__)
+
+
+class ColdTierExporter:
+    """Moves archive entries older than after_days into per-department, per-month segments.
+
+    Only whole calendar months that ended before the threshold are exported,
+    so every segment covers a month that no longer receives new entries. A
+    lease keeps two processes from exporting at once.
+    """
+
+    CHECKPOINT_ID = 'cold-tier'
+
+    def __init__(self, db, after_days=365, store=archive_segments):
+        self.db = db
+        self.lease = JobLease(db, self.CHECKPOINT_ID)
+        self.after_days = after_days
+        self.store = store
+
+    def run(self, now=None):
+        """Export every eligible month.
+
+        Returns the number of entries moved, or None when another process
+        holds the export.
+        """
+        if self.lease.acquire() is None:
+            logger.info('Cold-tier export is already running elsewhere')
+            return None
+        try:
+            return self._export(now or datetime.utcnow())
+        finally:
+            self.lease.release()
+
+    def _export(self, now):
+        threshold = now - timedelta(days=self.after_days)
+        before = datetime(threshold.year, threshold.month, 1)
+        archive_model = ArchiveModel(self.db)
+        moved = 0
+        for department_id, month in list(archive_model.iter_cold_months(before)):
+            if not self.lease.save():
+                logger.warning('Cold-tier export lost its lease; stopping')
+                break
+            count = archive_model.move_to_segment(department_id, month, self.store)
+            logger.info(f'Moved {count} archive entries for {department_id} {month} to the cold tier')
+            moved += count
+        return moved
+
+
+@archive_cli.command('export-cold')
+@click.option('--after-days', type=int, help='Export entries archived this long ago (default COLD_TIER_AFTER_DAYS).')
+def export_cold_command(after_days):
+    """Move old archive entries into cold-tier segment files."""
+    exporter = ColdTierExporter(current_app.db, after_days or current_app.config['COLD_TIER_AFTER_DAYS'])
+    moved = exporter.run()
+    if moved is None:
+        raise click.ClickException('Cold-tier export is already running in another process')
+    click.echo(f'Moved {moved} archive entries to the cold tier')
@@ -0,0 +1,45 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class JobLease:
+    """Exclusive, expiring lease on a job's job_checkpoints document.
+
+    Only the process holding the lease runs the job; a holder that dies
+    loses it once lease_until passes. The checkpoint document also carries
+    whatever progress the job saves through save().
+    """
+
+    def __init__(self, db, job_id, seconds=300):
+        self.collection = db.job_checkpoints
+        self.job_id = job_id
+        self.seconds = seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def acquire(self, now=None):
+        """The checkpoint document, now leased to this process, or None if another holds it"""
+        now = now or datetime.utcnow()
+        try:
+            return self.collection.find_one_and_update(
+                {'_id': self.job_id,
+                 '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}, {'owner': self.owner}]},
+                {'$set': {'owner': self.owner, 'lease_until': now + timedelta(seconds=self.seconds)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another process holds the lease
+            return None
+
+    def save(self, update=None):
+        """Apply update to the checkpoint and renew the lease; False once the lease was lost"""
+        update = update or {}
+        update.setdefault('$set', {})['lease_until'] = datetime.utcnow() + timedelta(seconds=self.seconds)
+        result = self.collection.update_one({'_id': self.job_id, 'owner': self.owner}, update)
+        return result.matched_count == 1
+
+    def release(self):
+        # Let the next run, here or elsewhere, start without waiting out the lease
+        self.collection.update_one({'_id': self.job_id, 'owner': self.owner}, {'$set': {'lease_until': None}})
@@ -1,5 +1,114 @@
-from datetime import datetime
-from pymongo import MongoClient
+import heapq
+import itertools
+import re
+import threading
+import weakref
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import bson
+from bson import ObjectId, Binary
+from pymongo import IndexModel, DeleteOne, UpdateOne, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+from models.task import VersionConflict
+from utils.segments import archive_segments
+
+# MongoDB's IllegalOperation code, returned for transactions on a standalone server
+_TRANSACTIONS_UNSUPPORTED = 20
+
+# Entries archived before partitioning stay in this collection
+LEGACY_COLLECTION = 'archives'
+
+_PARTITION_NAME = re.compile(r'^archives_(\d{4})_(\d{2})$')
+
+
+def _next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _parse_date(value, end=False):
+    """A filter date as naive UTC; a bare YYYY-MM-DD end date covers that whole day"""
+    if not value or isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(value)
+        if end and len(value) == 10:
+            parsed += timedelta(days=1) - timedelta(microseconds=1)
+    if parsed and parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class ArchivePartitions:
+    """Routes archive entries to one collection per month of archived_at, e.g. archives_2026_10.
+
+    An entry's _id is generated with its archived_at, so the partition holding
+    it is known from the _id alone. Date-bounded queries only visit the months
+    they cover, and retention drops whole partitions.
+    """
+
+    # Client -> (database, partition) pairs this process has seen indexed
+    _indexed = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    def __init__(self, db, indexes):
+        self.db = db
+        self.indexes = indexes
+
+    def name_for(self, date):
+        return f'archives_{date.year:04d}_{date.month:02d}'
+
+    def collection_for(self, date):
+        """The partition for entries archived at date, created with its indexes on first use.
+
+        Creating a collection isn't allowed in every transaction, so call this
+        before starting one.
+        """
+        name = self.name_for(date)
+        key = (self.db.name, name)
+        with self._lock:
+            indexed = self._indexed.setdefault(self.db.client, set())
+            if key not in indexed:
+                # Another process may have created the partition already
+                existing = {index['name'] for index in self.db[name].list_indexes()}
+                if not {index.document['name'] for index in self.indexes} <= existing:
+                    self.db[name].create_indexes(self.indexes)
+                indexed.add(key)
+        return self.db[name]
+
+    def collection_for_id(self, archive_id):
+        return self.db[self.name_for(archive_id.generation_time)]
+
+    def catalog(self):
+        """(month, collection name) for every partition, newest first, and whether the legacy collection exists"""
+        names = self.db.list_collection_names(filter={'name': {'$regex': r'^archives(_\d{4}_\d{2})?$'}})
+        months = []
+        for name in names:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                months.append((datetime(int(match.group(1)), int(match.group(2)), 1), name))
+        return sorted(months, reverse=True), LEGACY_COLLECTION in names
+
+    def route(self, start=None, end=None):
+        """Partitions that can hold entries archived between start and end, newest first,
+        and the legacy collection if it still exists (it can hold any date)"""
+        months, has_legacy = self.catalog()
+        partitions = [self.db[name] for month, name in months
+                      if (start is None or _next_month(month) > start) and (end is None or month <= end)]
+        return partitions, self.db[LEGACY_COLLECTION] if has_legacy else None
+
+    def drop_before(self, date):
+        """Drop every partition whose month ended by date; returns the months dropped"""
+        months, _ = self.catalog()
+        dropped = []
+        for month, name in months:
+            if _next_month(month) <= date:
+                self.db.drop_collection(name)
+                with self._lock:
+                    self._indexed.get(self.db.client, set()).discard((self.db.name, name))
+                dropped.append(month)
+        return sorted(dropped)
+
 
 class Archive:
     def __init__(self, task_id, department_id, title, description, status, archived_by):
@@ -12,62 +121,217 @@ class Archive:
         self.archived_at = datetime.now()
 
 class ArchiveModel:
+    INDEXES = [
+        IndexModel([('department_id', ASCENDING), ('archived_at', DESCENDING)], name='department_archived_at'),
+        IndexModel([('archived_at', DESCENDING)], name='archived_at'),
+        IndexModel([('task_id', ASCENDING)], name='task_id'),
+        # description only exists on entries archived before payloads were compressed
+        IndexModel([('title', TEXT), ('tags', TEXT), ('summary', TEXT), ('description', TEXT)],
+                   weights={'title': 10, 'tags': 5, 'summary': 1, 'description': 1}, name='archive_text')
+    ]
+
+    # Documents per cursor batch when streaming list queries
+    BATCH_SIZE = 200
+
+    # Task fields kept uncompressed on the archive entry for search and listing
+    SEARCH_FIELDS = ('title', 'status', 'priority', 'tags', 'created_by', 'assigned_to', 'due_date', 'created_at')
+
+    # Leading characters of the description kept searchable as the entry's summary
+    SUMMARY_LENGTH = 280
+
+    # Bulky payloads are left out of lists and searches
+    SUMMARY_PROJECTION = {'payload': 0, 'original_task_data': 0}
+
+    # Removed from entries moved to a cold segment, leaving a stub that still lists and searches
+    COLD_FIELDS = ('payload', 'payload_encoding', 'original_task_data', 'description')
+
     def __init__(self, db):
         self.db = db
-        self.collection = self.db['archives']
+        self.partitions = ArchivePartitions(db, self.INDEXES)
+        self.collection = self.db[LEGACY_COLLECTION]
         self.tasks_collection = self.db['tasks']
 
-    def archive_task(self, task_id, archived_by):
-        # Get the task from tasks collection
-        task = self.tasks_collection.find_one({'_id': task_id})
-        if not task:
-            raise ValueError("Task not found")
-
-        # Create archive entry
-        archive_entry = {
-            'task_id': task_id,
-            'department_id': task['department_id'],
-            'title': task['title'],
-            'description': task['description'],
-            'status': task['status'],
+    def index_registry(self):
+        """Collections to list in the startup index registry.
+
+        Partitions index themselves on first use. The legacy collection is
+        only listed while it exists: creating it would add it to every route.
+        """
+        _, has_legacy = self.partitions.catalog()
+        return {LEGACY_COLLECTION: self.INDEXES} if has_legacy else {}
+
+    def _new_ids(self, count):
+        """count fresh archive _ids, with the partitions they name created ahead of any transaction"""
+        archive_ids = [ObjectId() for _ in range(count)]
+        # _ids are generated in time order, so the first and last span every month used
+        for archive_id in (archive_ids[0], archive_ids[-1]):
+            self.partitions.collection_for(archive_id.generation_time)
+        return archive_ids
+
+    def _build_archive(self, archive_id, task, history, archived_by):
+        # archived_at comes from the _id so both always name the same partition
+        archive = {'_id': archive_id}
+        archive.update((field, task.get(field)) for field in self.SEARCH_FIELDS)
+        archive.update({
+            'task_id': str(task['_id']),
+            'department_id': task.get('department'),
+            'summary': (task.get('description') or '')[:self.SUMMARY_LENGTH],
             'archived_by': archived_by,
-            'archived_at': datetime.now(),
-            'original_task_data': task  # Store complete original task data
-        }
+            'archived_at': archive_id.generation_time.replace(tzinfo=None),
+            # Full task, change history and attachment references, BSON-encoded then deflated
+            'payload': Binary(zlib.compress(bson.encode({'task': task, 'history': history}))),
+            'payload_encoding': 'bson+zlib'
+        })
+        return archive
 
-        # Insert into archives
-        self.collection.insert_one(archive_entry)
-        
-        # Update task status in original collection
-        self.tasks_collection.update_one(
-            {'_id': task_id},
-            {'$set': {'status': 'Archived'}}
+    def decode_payload(self, payload):
+        return bson.decode(zlib.decompress(payload))
+
+    def _move_task(self, session, archive_id, task_id, archived_by, expected_version):
+        task = self.tasks_collection.find_one({'_id': ObjectId(task_id)}, session=session)
+        if not task:
+            return None
+        version = task.get('version')
+        if expected_version is not None and expected_version != (version or 0):
+            raise VersionConflict(version or 0)
+
+        history = list(self.db.task_history.find({'task_id': task_id}, {'task_id': 0}, session=session)
+                       .sort([('changed_at', ASCENDING), ('_id', ASCENDING)]))
+        archive = self._build_archive(archive_id, task, history, archived_by)
+        partition = self.partitions.collection_for_id(archive_id)
+        partition.insert_one(archive, session=session)
+
+        # The version guard catches a write that raced the read above
+        result = self.tasks_collection.delete_one({'_id': task['_id'], 'version': version}, session=session)
+        if not result.deleted_count:
+            if session is None:
+                partition.delete_one({'_id': archive['_id']})
+            raise VersionConflict()
+        self.db.task_history.delete_many({'task_id': task_id}, session=session)
+        return archive, task
+
+    def _in_transaction(self, callback):
+        """Run callback(session) in a transaction, or with session=None on a standalone server"""
+        try:
+            with self.db.client.start_session() as session:
+                return session.with_transaction(callback)
+        except OperationFailure as e:
+            if e.code != _TRANSACTIONS_UNSUPPORTED:
+                raise
+        return callback(None)
+
+    def archive_task(self, task_id, archived_by, expected_version=None):
+        """Move a task and its history into one archive entry inside a transaction.
+
+        Returns (archive entry, original task), or None when the task doesn't
+        exist. On a standalone server without transactions the same writes run
+        in order, archive first, so a failure never loses the task.
+        """
+        if not ObjectId.is_valid(task_id):
+            return None
+        archive_id, = self._new_ids(1)
+        return self._in_transaction(
+            lambda session: self._move_task(session, archive_id, task_id, archived_by, expected_version)
         )
 
-    def get_department_archives(self, department_id, start_date=None, end_date=None):
+    def _move_batch(self, session, archive_ids, tasks, archived_by):
+        task_ids = [str(task['_id']) for task in tasks]
+        history = defaultdict(list)
+        cursor = self.db.task_history.find({'task_id': {'$in': task_ids}}, session=session)
+        for entry in cursor.sort([('changed_at', ASCENDING), ('_id', ASCENDING)]):
+            history[entry.pop('task_id')].append(entry)
+
+        by_partition = defaultdict(list)
+        for archive_id, task in zip(archive_ids, tasks):
+            archive = self._build_archive(archive_id, task, history[str(task['_id'])], archived_by)
+            by_partition[self.partitions.name_for(archive['archived_at'])].append(archive)
+        for name, archives in by_partition.items():
+            self.db[name].insert_many(archives, session=session)
+        self.tasks_collection.bulk_write(
+            [DeleteOne({'_id': task['_id'], 'version': task.get('version')}) for task in tasks],
+            ordered=False, session=session
+        )
+
+        # Tasks written since they were read survive the version guard; drop their entries
+        remaining = {
+            str(task['_id']) for task in
+            self.tasks_collection.find({'_id': {'$in': [task['_id'] for task in tasks]}}, {'_id': 1}, session=session)
+        }
+        if remaining:
+            for name, archives in by_partition.items():
+                self.db[name].delete_many(
+                    {'_id': {'$in': [archive['_id'] for archive in archives]}, 'task_id': {'$in': list(remaining)}},
+                    session=session
+                )
+        moved = [task for task in tasks if str(task['_id']) not in remaining]
+        self.db.task_history.delete_many({'task_id': {'$in': [str(task['_id']) for task in moved]}}, session=session)
+        return moved
+
+    def archive_tasks(self, tasks, archived_by):
+        """Move already-read tasks and their history into archive entries with bulk writes.
+
+        The batch runs in one transaction. Tasks modified since they were read
+        are left in place. Returns the tasks that were archived.
+        """
+        if not tasks:
+            return []
+        archive_ids = self._new_ids(len(tasks))
+        return self._in_transaction(lambda session: self._move_batch(session, archive_ids, tasks, archived_by))
+
+    def _iter_archives(self, query, start=None, end=None, projection=SUMMARY_PROJECTION, ranked=False):
+        """Matching entries from the partitions covering start..end, newest first.
+
+        Partitions hold disjoint months, so their results are chained in
+        order; only the legacy collection and text relevance need a merge.
+        """
+        sort = [('score', {'$meta': 'textScore'})] if ranked else [('archived_at', DESCENDING), ('_id', DESCENDING)]
+
+        def find(collection):
+            return iter(collection.find(query, projection).sort(sort).batch_size(self.BATCH_SIZE))
+
+        collections, legacy = self.partitions.route(start, end)
+        legacy = [find(legacy)] if legacy is not None else []
+        if ranked:
+            return heapq.merge(*[find(c) for c in collections], *legacy,
+                               key=lambda archive: archive['score'], reverse=True)
+        partitioned = itertools.chain.from_iterable(find(c) for c in collections)
+        if not legacy:
+            return partitioned
+        return heapq.merge(partitioned, *legacy,
+                           key=lambda archive: (archive['archived_at'], archive['_id']), reverse=True)
+
+    def _date_query(self, start, end):
+        date_query = {}
+        if start:
+            date_query['$gte'] = start
+        if end:
+            date_query['$lte'] = end
+        return date_query
+
+    def iter_department_archives(self, department_id, start_date=None, end_date=None):
         query = {'department_id': department_id}
-        
-        if start_date or end_date:
-            date_query = {}
-            if start_date:
-                date_query['$gte'] = start_date
-            if end_date:
-                date_query['$lte'] = end_date
-            query['archived_at'] = date_query
+        start, end = _parse_date(start_date), _parse_date(end_date, end=True)
+        if start or end:
+            query['archived_at'] = self._date_query(start, end)
 
-        return list(self.collection.find(query))
+        return self._iter_archives(query, start, end)
 
-    def search_archives(self, filters):
+    def get_department_archives(self, department_id, start_date=None, end_date=None):
+        return list(self.iter_department_archives(department_id, start_date, end_date))
+
+    def iter_search_archives(self, filters):
         """
         Search archives with multiple filters
         filters: dict containing search criteria like:
         {
             'department_id': 'dept_id',
             'title': 'search_text',
+            'q': 'full text query, ranked by relevance',
             'status': 'status',
-            'start_date': datetime,
-            'end_date': datetime
+            'start_date': datetime or ISO 8601 string,
+            'end_date': datetime or ISO 8601 string
         }
+        Raises ValueError for an unparseable date.
         """
         query = {}
         
@@ -75,23 +339,118 @@ class ArchiveModel:
             query['department_id'] = filters['department_id']
         
         if 'title' in filters and filters['title']:
-            query['title'] = {'$regex': filters['title'], '$options': 'i'}
+            query['title'] = {'$regex': re.escape(filters['title']), '$options': 'i'}
         
         if 'status' in filters:
             query['status'] = filters['status']
         
-        if 'start_date' or 'end_date' in filters:
-            date_query = {}
-            if 'start_date' in filters:
-                date_query['$gte'] = filters['start_date']
-            if 'end_date' in filters:
-                date_query['$lte'] = filters['end_date']
-            query['archived_at'] = date_query
+        start, end = _parse_date(filters.get('start_date')), _parse_date(filters.get('end_date'), end=True)
+        if start or end:
+            query['archived_at'] = self._date_query(start, end)
+
+        if filters.get('q'):
+            query['$text'] = {'$search': filters['q']}
+            return self._iter_archives(query, start, end, dict(self.SUMMARY_PROJECTION, score={'$meta': 'textScore'}),
+                                       ranked=True)
 
-        return list(self.collection.find(query))
+        return self._iter_archives(query, start, end)
 
-    def get_archive_by_id(self, archive_id):
-        return self.collection.find_one({'_id': archive_id})
+    def search_archives(self, filters):
+        return list(self.iter_search_archives(filters))
+
+    def iter_cold_months(self, before):
+        """(department, 'YYYY-MM') pairs with entries archived before `before` still held in full"""
+        pipeline = [
+            {'$match': {'archived_at': {'$lt': before}, 'segment': {'$exists': False}}},
+            {'$group': {'_id': {'department_id': '$department_id',
+                                'month': {'$dateToString': {'format': '%Y-%m', 'date': '$archived_at'}}}}}
+        ]
+        partitions, legacy = self.partitions.route(end=before)
+        pairs = set()
+        for collection in partitions + ([legacy] if legacy is not None else []):
+            for row in collection.aggregate(pipeline):
+                pairs.add((row['_id']['month'], row['_id'].get('department_id')))
+        for month, department_id in sorted(pairs, key=lambda pair: (pair[0], str(pair[1]))):
+            yield department_id, month
+
+    def move_to_segment(self, department_id, month, store=archive_segments):
+        """Pack one department's entries for one month into a segment and stub them out.
+
+        The segment is durable on disk before any entry is stubbed, so a crash
+        in between leaves a spare segment behind, never a lost record.
+        Returns the number of entries moved.
+        """
+        start = datetime.strptime(month, '%Y-%m')
+        query = {'department_id': department_id, 'archived_at': {'$gte': start, '$lt': _next_month(start)},
+                 'segment': {'$exists': False}}
+        partitions, legacy = self.partitions.route(start, start)
+        sources = {}
+        summaries = {}
+
+        def documents():
+            for collection in partitions + ([legacy] if legacy is not None else []):
+                for archive in collection.find(query).sort('_id', ASCENDING).batch_size(self.BATCH_SIZE):
+                    sources[archive['_id']] = collection
+                    # Entries archived before summaries existed keep their description searchable
+                    if 'summary' not in archive:
+                        summaries[archive['_id']] = (archive.get('description') or '')[:self.SUMMARY_LENGTH]
+                    yield archive
+
+        name, ids = store.write(department_id, month, documents())
+        if not ids:
+            return 0
+        unset = {field: '' for field in self.COLD_FIELDS}
+        requests = defaultdict(list)
+        for archive_id in ids:
+            fields = {'segment': name}
+            if archive_id in summaries:
+                fields['summary'] = summaries[archive_id]
+            requests[sources[archive_id].name].append(
+                UpdateOne({'_id': archive_id, 'segment': {'$exists': False}}, {'$set': fields, '$unset': unset})
+            )
+        for collection_name, updates in requests.items():
+            for offset in range(0, len(updates), self.BATCH_SIZE):
+                self.db[collection_name].bulk_write(updates[offset:offset + self.BATCH_SIZE], ordered=False)
+        return len(ids)
+
+    def _find_entry(self, archive_id, projection=None):
+        # The _id names the partition; entries from before partitioning are in the legacy collection
+        return (self.partitions.collection_for_id(archive_id).find_one({'_id': archive_id}, projection) or
+                self.collection.find_one({'_id': archive_id}, projection))
+
+    def get_archive_by_id(self, archive_id, full=False):
+        """Archive entry; with full=True the compressed payload is decoded into task and history.
+
+        Full reads of entries moved to the cold tier come from their segment;
+        SegmentUnavailable is raised when that segment can't be read.
+        """
+        try:
+            archive = self._find_entry(ObjectId(archive_id), None if full else self.SUMMARY_PROJECTION)
+        except:
+            return None
+        if archive and full and archive.get('segment'):
+            archive = archive_segments.read(archive['segment'], archive['_id'])
+        if archive:
+            archive['_id'] = str(archive['_id'])
+            if full and 'payload' in archive:
+                archive.update(self.decode_payload(archive.pop('payload')))
+        return archive
 
     def delete_archive(self, archive_id):
-        return self.collection.delete_one({'_id': archive_id})
+        archive_id = ObjectId(archive_id)
+        result = self.partitions.collection_for_id(archive_id).delete_one({'_id': archive_id})
+        if not result.deleted_count:
+            result = self.collection.delete_one({'_id': archive_id})
+        return result
+
+    def drop_archived_before(self, date, store=archive_segments):
+        """Retention: drop the months that ended by date, partitions and cold segments alike.
+
+        Each month is one drop_collection; only entries still in the legacy
+        collection are deleted document by document. Returns the months dropped.
+        """
+        cutoff = datetime(date.year, date.month, 1)
+        months = self.partitions.drop_before(cutoff)
+        store.drop_before(cutoff.strftime('%Y-%m'))
+        self.collection.delete_many({'archived_at': {'$lt': cutoff}})
+        return months
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+# Policy _id that applies to departments without one of their own
+DEFAULT_POLICY = '*'
+
+
+class ArchivePolicy:
+    """Retention policies for the archival job, one document per department.
+
+    A policy archives tasks in one of `statuses` that haven't been updated for
+    `age_days` days, e.g. {'_id': 'Sales', 'statuses': ['done'], 'age_days': 180}.
+    """
+
+    DEFAULT_STATUSES = ['done']
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.archive_policies
+
+    def get_policies(self):
+        return list(self.collection.find().sort('_id', 1))
+
+    def get_policy(self, department):
+        return self.collection.find_one({'_id': department})
+
+    def set_policy(self, department, age_days, statuses=None):
+        if age_days <= 0:
+            raise ValueError('age_days must be positive')
+        policy = {
+            'statuses': list(statuses or self.DEFAULT_STATUSES),
+            'age_days': int(age_days),
+            'updated_at': datetime.utcnow()
+        }
+        self.collection.update_one({'_id': department}, {'$set': policy}, upsert=True)
+        return dict(policy, _id=department)
+
+    def delete_policy(self, department):
+        return self.collection.delete_one({'_id': department}).deleted_count > 0
+
+    def resolve(self, departments, now=None):
+        """The (department, status, cutoff) units to archive, for the given departments.
+
+        Tasks in a unit are eligible once their updated_at is before cutoff.
+        """
+        policies = {policy['_id']: policy for policy in self.get_policies()}
+        now = now or datetime.utcnow()
+        units = []
+        for department in sorted(departments):
+            policy = policies.get(department) or policies.get(DEFAULT_POLICY)
+            if not policy:
+                continue
+            cutoff = now - timedelta(days=policy['age_days'])
+            units.extend((department, status, cutoff) for status in policy['statuses'])
+        return units
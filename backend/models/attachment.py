@@ -0,0 +1,222 @@
+import hashlib
+import itertools
+from datetime import datetime, timedelta
+from bson import ObjectId, Binary
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+class UploadOffsetMismatch(Exception):
+    """Raised when upload data does not start at the session's committed offset"""
+
+    def __init__(self, received):
+        super().__init__('Upload offset does not match the bytes received so far')
+        self.received = received
+
+class UploadRangeTooSmall(Exception):
+    """Raised when an upload request can't commit a single chunk"""
+
+    def __init__(self, chunk_size):
+        super().__init__(f'Each upload request must carry at least one whole chunk of {chunk_size} bytes, '
+                         'or run to the end of the file')
+        self.chunk_size = chunk_size
+
+def _read_exact(stream, size):
+    """Read size bytes from stream, or fewer only at end of stream"""
+    parts = []
+    while size > 0:
+        part = stream.read(size)
+        if not part:
+            break
+        parts.append(part)
+        size -= len(part)
+    return b''.join(parts)
+
+class Attachment:
+    """Files stored as fixed-size chunks keyed by SHA-256, so repeated content is stored once.
+
+    A file document lists its chunk digests in order; chunks live in their own
+    collection and are shared between files. Uploads are sessions that commit
+    whole chunks as they arrive and can be resumed from the committed offset.
+    """
+
+    STATUS = {
+        'PENDING': 'pending',
+        'COMPLETE': 'complete'
+    }
+
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+    # Unfinished uploads are dropped by the TTL index after this long
+    UPLOAD_TTL = timedelta(days=1)
+
+    # Chunks fetched per query while streaming a download
+    READ_BATCH = 4
+
+    # Chunks written within this window are never swept, so an upload can push a digest it just stored
+    CHUNK_SWEEP_GRACE = timedelta(hours=1)
+
+    # Chunk digests checked for references per query while sweeping
+    SWEEP_BATCH = 500
+
+    INDEXES = [
+        # Only pending uploads carry expires_at
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='pending_expiry'),
+        IndexModel([('digest', ASCENDING), ('size', ASCENDING)], name='digest_size',
+                   partialFilterExpression={'status': 'complete'}),
+        IndexModel([('chunks', ASCENDING)], name='chunks')
+    ]
+
+    CHUNK_INDEXES = [
+        IndexModel([('touched_at', ASCENDING)], name='touched_at')
+    ]
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.attachments
+        self.chunks = db.attachment_chunks
+
+    def start_upload(self, task_id, filename, content_type, size, user_id, chunk_size=None):
+        now = datetime.utcnow()
+        upload = {
+            'task_id': str(task_id),
+            'filename': filename,
+            'content_type': content_type or 'application/octet-stream',
+            'size': size,
+            'chunk_size': chunk_size or self.DEFAULT_CHUNK_SIZE,
+            'chunks': [],
+            'received': 0,
+            'status': self.STATUS['PENDING'],
+            'uploaded_by': user_id,
+            'created_at': now,
+            'expires_at': now + self.UPLOAD_TTL
+        }
+        result = self.collection.insert_one(upload)
+        upload['_id'] = str(result.inserted_id)
+        return upload
+
+    def get_file(self, file_id, projection=None):
+        try:
+            document = self.collection.find_one({'_id': ObjectId(file_id)}, projection)
+            if document:
+                document['_id'] = str(document['_id'])
+            return document
+        except:
+            return None
+
+    def _put_chunk(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            self.chunks.update_one(
+                {'_id': digest},
+                {'$setOnInsert': {'data': Binary(data), 'size': len(data)},
+                 '$set': {'touched_at': datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another upload inserted the same chunk concurrently
+            pass
+        return digest
+
+    def append(self, upload, offset, stream, length):
+        """Store length bytes read from stream at offset; returns the new committed offset.
+
+        Only whole chunks, or the file's final chunk, are committed. Trailing
+        bytes that don't fill a chunk are dropped and the client resends them
+        from the returned offset, so at most one chunk is held in memory.
+        Raises UploadRangeTooSmall when nothing could be committed.
+        """
+        if upload['received'] != offset:
+            raise UploadOffsetMismatch(upload['received'])
+
+        chunk_size = upload['chunk_size']
+        start = offset
+        end = min(offset + length, upload['size'])
+        if end - offset < chunk_size and end != upload['size']:
+            raise UploadRangeTooSmall(chunk_size)
+        while offset < end:
+            data = _read_exact(stream, min(chunk_size, end - offset))
+            if len(data) < chunk_size and offset + len(data) != upload['size']:
+                break
+            digest = self._put_chunk(data)
+            result = self.collection.update_one(
+                {'_id': ObjectId(upload['_id']), 'status': self.STATUS['PENDING'], 'received': offset},
+                {'$push': {'chunks': digest}, '$inc': {'received': len(data)}}
+            )
+            if not result.modified_count:
+                current = self.get_file(upload['_id'], {'received': 1})
+                raise UploadOffsetMismatch(current['received'] if current else offset)
+            offset += len(data)
+        if offset == start:
+            # The body ended before the first chunk its Content-Range promised
+            raise UploadRangeTooSmall(chunk_size)
+        return offset
+
+    def complete(self, upload_id):
+        """Finish a fully received upload, reusing an identical stored file when there is one"""
+        upload = self.get_file(upload_id)
+        if not upload or upload['received'] != upload['size']:
+            return None
+        if upload['status'] == self.STATUS['COMPLETE']:
+            return upload
+
+        # Hash of the ordered chunk digests; identifies the content without re-reading it
+        digest = hashlib.sha256(''.join(upload['chunks']).encode('ascii')).hexdigest()
+        existing = self.collection.find_one({
+            'digest': digest,
+            'size': upload['size'],
+            'status': self.STATUS['COMPLETE']
+        })
+        if existing:
+            self.collection.delete_one({'_id': ObjectId(upload_id)})
+            existing['_id'] = str(existing['_id'])
+            return existing
+
+        self.collection.update_one(
+            {'_id': ObjectId(upload_id)},
+            {'$set': {'status': self.STATUS['COMPLETE'], 'digest': digest}, '$unset': {'expires_at': ''}}
+        )
+        upload.update(status=self.STATUS['COMPLETE'], digest=digest)
+        upload.pop('expires_at', None)
+        return upload
+
+    def iter_range(self, stored_file, start, stop):
+        """Yield the bytes in [start, stop) of a stored file, a few chunks at a time"""
+        chunk_size = stored_file['chunk_size']
+        first = start // chunk_size
+        digests = stored_file['chunks'][first:(stop - 1) // chunk_size + 1]
+        position = first * chunk_size
+        for i in range(0, len(digests), self.READ_BATCH):
+            batch = digests[i:i + self.READ_BATCH]
+            found = {chunk['_id']: chunk['data'] for chunk in self.chunks.find({'_id': {'$in': batch}})}
+            for digest in batch:
+                data = found[digest]
+                yield bytes(data[max(start - position, 0):min(stop - position, len(data))])
+                position += len(data)
+
+    def sweep_chunks(self, now=None):
+        """Delete chunks no stored file or pending upload references; returns the number deleted.
+
+        Covers uploads removed by the TTL index and uploads replaced by an
+        identical stored file. Chunks touched within CHUNK_SWEEP_GRACE are
+        left alone, since an upload may be about to reference them.
+        """
+        cutoff = (now or datetime.utcnow()) - self.CHUNK_SWEEP_GRACE
+        cursor = self.chunks.find({'touched_at': {'$lt': cutoff}}, {'_id': 1}).batch_size(self.SWEEP_BATCH)
+        digests = (chunk['_id'] for chunk in cursor)
+        deleted = 0
+        while True:
+            batch = list(itertools.islice(digests, self.SWEEP_BATCH))
+            if not batch:
+                return deleted
+            referenced = {row['_id'] for row in self.collection.aggregate([
+                {'$match': {'chunks': {'$in': batch}}},
+                {'$unwind': '$chunks'},
+                {'$match': {'chunks': {'$in': batch}}},
+                {'$group': {'_id': '$chunks'}}
+            ])}
+            orphans = [digest for digest in batch if digest not in referenced]
+            if orphans:
+                # touched_at is rechecked so a chunk reused since the scan survives
+                deleted += self.chunks.delete_many(
+                    {'_id': {'$in': orphans}, 'touched_at': {'$lt': cutoff}}
+                ).deleted_count
@@ -1,7 +1,14 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from utils.pagination import PAGE_SORT, keyset_filter
 
 class Comment:
+    INDEXES = [
+        IndexModel([('task_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='task_created_at_id')
+    ]
+
     def __init__(self, db):
         self.db = db
         self.collection = db.comments  # Reference to comments collection
@@ -17,9 +24,20 @@ class Comment:
         comment['_id'] = str(result.inserted_id)
         return comment
 
-    def get_comments_by_task_id(self, task_id):
-        comments = list(self.collection.find({'task_id': ObjectId(task_id)}))
+    def get_comments_by_task_id(self, task_id, limit=None, after=None):
+        """Comments on a task, newest first, optionally after a (created_at, _id) cursor"""
+        query = {'task_id': ObjectId(task_id)}
+        if after:
+            query = {'$and': [query, keyset_filter(after)]}
+        cursor = self.collection.find(query).sort(PAGE_SORT)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def hydrate_authors(self, comments, user_model):
+        """Attach each comment's author name and department, resolved in one batch"""
+        summaries = user_model.get_user_summaries(comment['user_id'] for comment in comments)
         for comment in comments:
-            comment['_id'] = str(comment['_id'])
-            comment['user_id'] = str(comment['user_id'])  # Convert user_id to string
+            user_id = str(comment['user_id'])
+            comment['author'] = summaries.get(user_id, {'_id': user_id, 'name': None, 'department': None})
         return comments
@@ -0,0 +1,115 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from pymongo import IndexModel, UpdateOne, ASCENDING
+
+logger = logging.getLogger(__name__)
+
+class DashboardCounters:
+    """Task counts per department and status, and user counts per department.
+
+    One counters document per (kind, department) is kept current with $inc
+    from the task and user models, so the dashboard reads O(departments)
+    documents instead of counting collections. reconcile() recounts from the
+    source collections and repairs any drift.
+    """
+
+    INDEXES = [
+        IndexModel([('department', ASCENDING)], name='department')
+    ]
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.counters
+
+    def apply(self, deltas):
+        """Apply {(kind, department): {field: delta}} in one unordered bulk_write"""
+        requests = []
+        now = datetime.utcnow()
+        for (kind, department), fields in deltas.items():
+            increments = {field: delta for field, delta in fields.items() if delta}
+            if not increments:
+                continue
+            requests.append(UpdateOne(
+                {'_id': f'{kind}:{department}'},
+                {'$inc': increments,
+                 '$set': {'updated_at': now},
+                 '$setOnInsert': {'kind': kind, 'department': department}},
+                upsert=True
+            ))
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+
+    def task_deltas(self, deltas, department, old_status=None, new_status=None):
+        """Add a task status transition to deltas; None for a creation or removal"""
+        fields = deltas.setdefault(('tasks', department), defaultdict(int))
+        if old_status is not None:
+            fields[f'status.{old_status}'] -= 1
+            fields['total'] -= 1
+        if new_status is not None:
+            fields[f'status.{new_status}'] += 1
+            fields['total'] += 1
+        return deltas
+
+    def user_deltas(self, deltas, old_department=None, new_department=None):
+        if old_department is not None:
+            deltas.setdefault(('users', old_department), defaultdict(int))['total'] -= 1
+        if new_department is not None:
+            deltas.setdefault(('users', new_department), defaultdict(int))['total'] += 1
+        return deltas
+
+    def task_changed(self, department, old_status=None, new_status=None):
+        if old_status != new_status:
+            self.apply(self.task_deltas({}, department, old_status, new_status))
+
+    def user_changed(self, old_department=None, new_department=None):
+        if old_department != new_department:
+            self.apply(self.user_deltas({}, old_department, new_department))
+
+    def get_counters(self, department=None):
+        query = {'department': department} if department is not None else {}
+        return list(self.collection.find(query))
+
+    def _actual_counts(self):
+        actual = {}
+        pipeline = [{'$group': {'_id': {'department': '$department', 'status': '$status'}, 'count': {'$sum': 1}}}]
+        for row in self.db.tasks.aggregate(pipeline):
+            fields = actual.setdefault(('tasks', row['_id'].get('department')), {'status': {}, 'total': 0})
+            fields['status'][row['_id'].get('status')] = row['count']
+            fields['total'] += row['count']
+        pipeline = [{'$group': {'_id': '$department', 'count': {'$sum': 1}}}]
+        for row in self.db.users.aggregate(pipeline):
+            actual[('users', row['_id'])] = {'total': row['count']}
+        return actual
+
+    def reconcile(self):
+        """Recount from tasks and users and overwrite counters that drifted.
+
+        Writes that land between the recount and the overwrite can be lost, so
+        this runs periodically rather than being relied on once.
+        """
+        actual = self._actual_counts()
+        stored = {(doc['kind'], doc['department']): doc for doc in self.collection.find()}
+        requests = []
+        now = datetime.utcnow()
+        for key in set(actual) | set(stored):
+            kind, department = key
+            expected = actual.get(key, {'status': {}, 'total': 0} if kind == 'tasks' else {'total': 0})
+            current = stored.get(key, {})
+            if kind == 'tasks':
+                # Zeroed statuses are dropped so they compare equal to absent ones
+                current = {'status': {s: n for s, n in current.get('status', {}).items() if n},
+                           'total': current.get('total', 0)}
+            else:
+                current = {'total': current.get('total', 0)}
+            if current == expected:
+                continue
+            logger.warning(f"Dashboard counters drifted for {kind}:{department}: {current} -> {expected}")
+            requests.append(UpdateOne(
+                {'_id': f'{kind}:{department}'},
+                {'$set': dict(expected, kind=kind, department=department, updated_at=now)},
+                upsert=True
+            ))
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+        return len(requests)
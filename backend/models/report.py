@@ -1,5 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
 
 class Report:
     TEMPLATES = {
@@ -9,6 +10,20 @@ class Report:
         'ARCHIVE_SUMMARY': 'archive_summary'
     }
 
+    INDEXES = [
+        IndexModel([('department', ASCENDING), ('created_at', DESCENDING)], name='department_created_at'),
+        IndexModel([('generated_by', ASCENDING), ('created_at', DESCENDING)], name='generated_by_created_at')
+    ]
+
+    PROJECTIONS = {
+        'detail': None,
+        # Reports are never modified, so created_at versions them
+        'etag': {'created_at': 1, 'department': 1, 'generated_by': 1}
+    }
+
+    # Documents per cursor batch when streaming list queries
+    BATCH_SIZE = 200
+
     DEFAULT_TEMPLATES = [
         {
             'name': 'Task Summary Report',
@@ -96,26 +111,30 @@ class Report:
         report['_id'] = str(result.inserted_id)
         return report
 
-    def get_report_by_id(self, report_id):
+    def get_report_by_id(self, report_id, profile='detail'):
         try:
-            report = self.collection.find_one({'_id': ObjectId(report_id)})
+            report = self.collection.find_one({'_id': ObjectId(report_id)}, self.PROJECTIONS[profile])
             if report:
                 report['_id'] = str(report['_id'])
             return report
         except:
             return None
 
+    def _iter_reports(self, query):
+        cursor = self.collection.find(query).sort('created_at', -1).batch_size(self.BATCH_SIZE)
+        return iter(cursor)
+
+    def iter_department_reports(self, department):
+        return self._iter_reports({'department': department})
+
+    def iter_user_reports(self, user_id):
+        return self._iter_reports({'generated_by': user_id})
+
     def get_department_reports(self, department):
-        reports = list(self.collection.find({'department': department}).sort('created_at', -1))
-        for report in reports:
-            report['_id'] = str(report['_id'])
-        return reports
+        return list(self.iter_department_reports(department))
 
     def get_user_reports(self, user_id):
-        reports = list(self.collection.find({'generated_by': user_id}).sort('created_at', -1))
-        for report in reports:
-            report['_id'] = str(report['_id'])
-        return reports
+        return list(self.iter_user_reports(user_id))
 
     def get_template(self, template_id):
         try:
@@ -127,10 +146,7 @@ class Report:
             return None
 
     def get_templates(self):
-        templates = list(self.templates_collection.find())
-        for template in templates:
-            template['_id'] = str(template['_id'])
-        return templates
+        return list(self.templates_collection.find())
 
     def create_template(self, data):
         template = {
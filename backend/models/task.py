@@ -1,8 +1,24 @@
+import re
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel, ReturnDocument, InsertOne, UpdateOne, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import BulkWriteError
 from utils import has_permission
+from utils.pagination import PAGE_SORT, keyset_filter
+from utils.search import highlight_document
+from utils.due_dates import due_date_scheduler, is_overdue
+from utils.events import task_events
+from models.task_history import TaskHistory
+from models.dashboard import DashboardCounters
 # Removed redundant import
 
+class VersionConflict(Exception):
+    """Raised when a task changed between being read and being written"""
+
+    def __init__(self, version=None):
+        super().__init__('Task was modified by another request')
+        self.version = version
+
 class Task:
     STATUS = {
         'NOT_STARTED': 'not_started',
@@ -12,39 +28,120 @@ class Task:
         'ARCHIVED': 'archived'
     }
 
+    INDEXES = [
+        IndexModel([('department', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='department_created_at'),
+        IndexModel([('department', ASCENDING), ('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='department_status_created_at'),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='status_created_at'),
+        IndexModel([('created_by', ASCENDING), ('created_at', DESCENDING)], name='created_by_created_at'),
+        IndexModel([('assigned_to', ASCENDING), ('created_at', DESCENDING)], name='assigned_to_created_at'),
+        IndexModel([('tags', ASCENDING)], name='tags'),
+        # Candidate scan for the retention-driven archival job
+        IndexModel([('department', ASCENDING), ('status', ASCENDING), ('updated_at', ASCENDING), ('_id', ASCENDING)],
+                   name='department_status_updated_at'),
+        IndexModel([('department', ASCENDING)], name='department_overdue',
+                   partialFilterExpression={'overdue': True}),
+        IndexModel([('title', TEXT), ('description', TEXT), ('tags', TEXT)],
+                   weights={'title': 10, 'tags': 5, 'description': 1}, name='task_text')
+    ]
+
+    # Fields covered by the text index, in the order highlights are returned
+    TEXT_FIELDS = ('title', 'description', 'tags')
+
+    # Documents per cursor batch when streaming list queries
+    BATCH_SIZE = 500
+
+    # Task fields carried by change events; includes everything can_view checks
+    EVENT_FIELDS = ('title', 'status', 'priority', 'department', 'created_by', 'assigned_to',
+                    'due_date', 'overdue', 'version', 'updated_at')
+
+    # Attempts at an unconditional update before giving up on a contended task
+    UPDATE_RETRIES = 3
+
+    # Tokens of recent bulk writes kept on each task, to tell which guarded updates applied
+    WRITE_TOKENS = 8
+
+    # Named field projections applied in the query itself; None means the full document
+    PROJECTIONS = {
+        'list': {'change_log': 0, 'attachments': 0, 'write_tokens': 0},
+        'detail': {'write_tokens': 0},
+        # Just what a conditional GET needs: the version and the fields can_view checks
+        'etag': {'version': 1, 'department': 1, 'created_by': 1, 'assigned_to': 1},
+        'attachments': {'attachments': 1, 'department': 1, 'created_by': 1, 'assigned_to': 1}
+    }
+
     def __init__(self, db):
         self.db = db
         self.collection = db.tasks
 
-    def create_task(self, data):
-        task = {
+    def _build_task(self, data):
+        now = datetime.utcnow()
+        status = data.get('status', self.STATUS['NOT_STARTED'])
+        return {
             'title': data['title'],
             'description': data['description'],
             'department': data['department'],
             'created_by': data['created_by'],  # User ID
             'assigned_to': data.get('assigned_to', None),  # User ID or None
-            'status': data.get('status', self.STATUS['NOT_STARTED']),
+            'status': status,
             'priority': data.get('priority', 'medium'),
             'due_date': data.get('due_date', None),
+            'overdue': is_overdue(data.get('due_date'), status, now),
             'attachments': data.get('attachments', []),
             'tags': data.get('tags', []),  # Initialize tags as empty array if not provided
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow(),
-            'change_log': [{
-                'field': 'status',
-                'old_value': None,
-                'new_value': self.STATUS['NOT_STARTED'],
-                'changed_by': data['created_by'],
-                'changed_at': datetime.utcnow()
-            }]
+            'created_at': now,
+            'updated_at': now,
+            'version': 1
         }
+
+    def _publish(self, event_type, task):
+        summary = {field: task.get(field) for field in self.EVENT_FIELDS}
+        summary['_id'] = str(task['_id'])
+        task_events.publish(event_type, summary)
+
+    def _event_type(self, old_status, new_status):
+        if new_status != old_status:
+            if new_status == self.STATUS['ARCHIVED']:
+                return 'archived'
+            if new_status == self.STATUS['DONE'] and old_status == self.STATUS['PENDING_APPROVAL']:
+                return 'approved'
+        return 'updated'
+
+    def _initial_history(self, data):
+        return [{
+            'field': 'status',
+            'old_value': None,
+            'new_value': self.STATUS['NOT_STARTED'],
+            'changed_by': data['created_by'],
+            'changed_at': datetime.utcnow()
+        }]
+
+    def create_task(self, data):
+        task = self._build_task(data)
         result = self.collection.insert_one(task)
         task['_id'] = str(result.inserted_id)
+        TaskHistory(self.db).record(task['_id'], self._initial_history(data))
+        DashboardCounters(self.db).task_changed(task['department'], None, task['status'])
+        due_date_scheduler.track(task)
+        self._publish('created', task)
         return task
 
-    def get_task_by_id(self, task_id):
+    def get_tasks_by_ids(self, task_ids, profile='list'):
+        """Tasks keyed by string id, fetched with a single $in query"""
+        object_ids = [ObjectId(task_id) for task_id in task_ids if ObjectId.is_valid(task_id)]
+        if not object_ids:
+            return {}
+        tasks = {}
+        for task in self.collection.find({'_id': {'$in': object_ids}}, self.PROJECTIONS[profile]):
+            task['_id'] = str(task['_id'])
+            tasks[task['_id']] = task
+        return tasks
+
+    def get_task_by_id(self, task_id, profile='detail'):
         try:
-            task = self.collection.find_one({'_id': ObjectId(task_id)})
+            task = self.collection.find_one({'_id': ObjectId(task_id)}, self.PROJECTIONS[profile])
             if task:
                 task['_id'] = str(task['_id'])
                 # Ensure tags is always an array
@@ -54,12 +151,22 @@ class Task:
         except:
             return None
 
-    def update_task(self, task_id, data, user_id):
-        current_task = self.get_task_by_id(task_id)
-        if not current_task:
-            return None
+    def _iter_tasks(self, query, profile, limit=None, after=None):
+        """Stream a list query in keyset order, optionally starting after a (created_at, _id) key"""
+        if after:
+            query = {'$and': [query, keyset_filter(after)]}
+        cursor = self.collection.find(query, self.PROJECTIONS[profile]).sort(PAGE_SORT).batch_size(self.BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        for task in cursor:
+            # Ensure tags is always an array
+            if 'tags' not in task:
+                task['tags'] = []
+            yield task
 
-        update_data = {'updated_at': datetime.utcnow()}
+    def _build_update(self, current_task, data, user_id, now=None):
+        """Update document and change log entries for applying data to current_task"""
+        update_data = {'updated_at': now or datetime.utcnow()}
         change_log = []
 
         # Track changes for each field, including status change
@@ -80,22 +187,200 @@ class Task:
             if field in data:
                 update_data[field] = data[field]
 
+        # Keep the overdue flag in step with the fields it is derived from
+        if 'due_date' in update_data or 'status' in update_data:
+            update_data['overdue'] = is_overdue(
+                update_data.get('due_date', current_task.get('due_date')),
+                update_data.get('status', current_task.get('status')),
+                update_data['updated_at']
+            )
+
+        update = {'$set': update_data, '$inc': {'version': 1}}
+
         # Handle attachments separately (append new ones)
         if 'attachments' in data:
-            update_data['attachments'] = current_task.get('attachments', []) + data['attachments']
+            update['$push'] = {'attachments': {'$each': data['attachments']}}
 
-        # Set the change log entries directly
-        if change_log:
-            update_data['change_log'] = current_task.get('change_log', []) + change_log
+        return update, change_log
 
-        result = self.collection.update_one(
-            {'_id': ObjectId(task_id)},
-            {'$set': update_data}
-        )
-        
-        return self.get_task_by_id(task_id) if result.modified_count > 0 else None
+    def update_task(self, task_id, data, user_id, expected_version=None, current_task=None, precondition=None):
+        """Apply an update with one find_one_and_update guarded by the task version.
+
+        current_task may be passed when the caller has already read the task.
+        precondition is a dict of field values the task must still have; it is
+        part of the guarded filter, so a retry never applies data to a task
+        that has since left that state. Raises VersionConflict when
+        expected_version (If-Match) is stale or the precondition no longer
+        holds; without If-Match, a concurrent write is retried against a
+        fresh read.
+        """
+        precondition = precondition or {}
+        for _ in range(self.UPDATE_RETRIES):
+            if current_task is None:
+                # History and attachments are appended atomically, so they are never read here
+                current_task = self.get_task_by_id(task_id, 'list')
+                if not current_task:
+                    return None
+
+            version = current_task.get('version')
+            if expected_version is not None and expected_version != (version or 0):
+                raise VersionConflict(version or 0)
+            if any(current_task.get(field) != value for field, value in precondition.items()):
+                raise VersionConflict(version or 0)
+
+            update, change_log = self._build_update(current_task, data, user_id)
+            task = self.collection.find_one_and_update(
+                # Tasks created before versioning have no version field; None matches them
+                dict(precondition, _id=ObjectId(task_id), version=version),
+                update,
+                projection=self.PROJECTIONS['detail'],
+                return_document=ReturnDocument.AFTER
+            )
+            if task:
+                TaskHistory(self.db).record(task_id, change_log)
+                DashboardCounters(self.db).task_changed(
+                    task.get('department'), current_task.get('status'), task.get('status')
+                )
+                due_date_scheduler.track(task)
+                self._publish(self._event_type(current_task.get('status'), task.get('status')), task)
+                task['_id'] = str(task['_id'])
+                # Ensure tags is always an array
+                if 'tags' not in task:
+                    task['tags'] = []
+                return task
+
+            if expected_version is not None:
+                raise VersionConflict()
+            current_task = None
+
+        raise VersionConflict()
+
+    def bulk_write_tasks(self, creates, updates, user_id):
+        """Apply creates and version-guarded updates in one unordered bulk_write.
+
+        creates is a list of (key, data) and updates a list of
+        (key, current_task, data). Returns {key: task summary or error}.
+        """
+        now = datetime.utcnow()
+        requests, keys, history, results, written_tasks = [], [], {}, {}, {}
+
+        for key, data in creates:
+            task = self._build_task(data)
+            task['_id'] = ObjectId()
+            requests.append(InsertOne(task))
+            keys.append(key)
+            history[key] = (str(task['_id']), self._initial_history(data))
+            results[key] = {'task_id': str(task['_id']), 'version': 1}
+            written_tasks[key] = task
 
-    def get_department_tasks(self, department, status=None, user=None, exclude_archived=False):
+        updated, tokens = {}, {}
+        for key, current_task, data in updates:
+            update, change_log = self._build_update(current_task, data, user_id, now)
+            # A token unique to this op shows afterwards whether its guarded update applied
+            tokens[key] = ObjectId()
+            update.setdefault('$push', {})['write_tokens'] = {'$each': [tokens[key]], '$slice': -self.WRITE_TOKENS}
+            requests.append(UpdateOne(
+                {'_id': ObjectId(current_task['_id']), 'version': current_task.get('version')},
+                update
+            ))
+            keys.append(key)
+            history[key] = (current_task['_id'], change_log)
+            updated[key] = current_task
+            # As stored once the update applies, including its $inc of version
+            written_tasks[key] = dict(current_task, **update['$set'], version=(current_task.get('version') or 0) + 1)
+        if not requests:
+            return results
+
+        try:
+            result = self.collection.bulk_write(requests, ordered=False)
+            matched = result.matched_count
+        except BulkWriteError as e:
+            matched = e.details.get('nMatched', 0)
+            for error in e.details.get('writeErrors', []):
+                key = keys[error['index']]
+                results[key] = {'error': error['errmsg']}
+                history.pop(key, None)
+
+        for key, current_task in updated.items():
+            if key in history:
+                results[key] = {'task_id': current_task['_id'], 'version': written_tasks[key]['version']}
+
+        # Only re-read when some version guard failed
+        if matched < len(updated):
+            written = self.collection.find(
+                {'_id': {'$in': [ObjectId(task['_id']) for task in updated.values()]},
+                 'write_tokens': {'$in': list(tokens.values())}},
+                {'write_tokens': 1}
+            )
+            written = {token for task in written for token in task['write_tokens']}
+            for key, current_task in updated.items():
+                if key in history and tokens[key] not in written:
+                    results[key] = {'error': str(VersionConflict())}
+                    history.pop(key, None)
+
+        TaskHistory(self.db).record_many(history.values())
+        counters = DashboardCounters(self.db)
+        deltas = {}
+        for key in history:
+            task = written_tasks[key]
+            old_status = updated[key].get('status') if key in updated else None
+            if old_status != task.get('status'):
+                counters.task_deltas(deltas, task.get('department'), old_status, task.get('status'))
+            due_date_scheduler.track(task)
+            self._publish('created' if key not in updated else self._event_type(old_status, task.get('status')), task)
+        counters.apply(deltas)
+        return results
+
+    def count_overdue_by_department(self):
+        """Overdue open tasks per department, straight from the database"""
+        pipeline = [
+            {'$match': {'overdue': True, 'status': {'$nin': [self.STATUS['DONE'], self.STATUS['ARCHIVED']]}}},
+            {'$group': {'_id': '$department', 'count': {'$sum': 1}}}
+        ]
+        return {row['_id']: row['count'] for row in self.collection.aggregate(pipeline)}
+
+    def archive_task(self, task_id, user_id, expected_version=None):
+        """Move the task into the archive; returns the archive entry without its payload"""
+        from models.archive import ArchiveModel
+        moved = ArchiveModel(self.db).archive_task(task_id, user_id, expected_version)
+        if not moved:
+            return None
+        archive, task = moved
+        self.record_archived([task])
+        archive.pop('payload', None)
+        return archive
+
+    def archive_tasks(self, versions, user_id):
+        """Move tasks into the archive with bulk writes.
+
+        versions maps task id to the version the caller checked; tasks that
+        changed since are left in place. Returns the ids archived.
+        """
+        from models.archive import ArchiveModel
+        object_ids = [ObjectId(task_id) for task_id in versions]
+        tasks = [
+            task for task in self.collection.find({'_id': {'$in': object_ids}})
+            if task.get('version') == versions[str(task['_id'])]
+        ]
+        moved = ArchiveModel(self.db).archive_tasks(tasks, user_id)
+        self.record_archived(moved)
+        return {str(task['_id']) for task in moved}
+
+    def record_archived(self, tasks):
+        """Update counters, the due-date schedule and the event feed for tasks moved to the archive"""
+        counters = DashboardCounters(self.db)
+        deltas = {}
+        for task in tasks:
+            counters.task_deltas(deltas, task.get('department'), task.get('status'), None)
+            task['status'] = self.STATUS['ARCHIVED']
+            due_date_scheduler.track(task)
+            self._publish('archived', task)
+        counters.apply(deltas)
+
+    def get_department_tasks(self, department, status=None, user=None, exclude_archived=False, profile='list', limit=None, after=None):
+        return list(self.iter_department_tasks(department, status, user, exclude_archived, profile, limit, after))
+
+    def iter_department_tasks(self, department, status=None, user=None, exclude_archived=False, profile='list', limit=None, after=None):
         if user and has_permission(user, 'view_all_tasks'):
             query = {}
         else:
@@ -105,15 +390,12 @@ class Task:
         if exclude_archived:
             query['status'] = {'$ne': self.STATUS['ARCHIVED']}
         
-        tasks = list(self.collection.find(query).sort('created_at', -1))
-        for task in tasks:
-            task['_id'] = str(task['_id'])
-            # Ensure tags is always an array
-            if 'tags' not in task:
-                task['tags'] = []
-        return tasks
+        return self._iter_tasks(query, profile, limit, after)
+
+    def get_user_tasks(self, user_id, department=None, profile='list', limit=None, after=None):
+        return list(self.iter_user_tasks(user_id, department, profile, limit, after))
 
-    def get_user_tasks(self, user_id, department=None):
+    def iter_user_tasks(self, user_id, department=None, profile='list', limit=None, after=None):
         query = {
             '$or': [
                 {'created_by': user_id},
@@ -123,15 +405,9 @@ class Task:
         if department:
             query['department'] = department
 
-        tasks = list(self.collection.find(query).sort('created_at', -1))
-        for task in tasks:
-            task['_id'] = str(task['_id'])
-            # Ensure tags is always an array
-            if 'tags' not in task:
-                task['tags'] = []
-        return tasks
+        return self._iter_tasks(query, profile, limit, after)
 
-    def search_tasks(self, filters):
+    def _search_query(self, filters):
         query = {}
         
         if 'department' in filters:
@@ -141,7 +417,7 @@ class Task:
             query['status'] = filters['status']
         
         if 'title' in filters:
-            query['title'] = {'$regex': filters['title'], '$options': 'i'}
+            query['title'] = {'$regex': re.escape(filters['title']), '$options': 'i'}
         
         if 'date_range' in filters:
             query['created_at'] = {
@@ -155,30 +431,38 @@ class Task:
         if 'tags' in filters:
             query['tags'] = {'$all': filters['tags']}
 
-        tasks = list(self.collection.find(query).sort('created_at', -1))
+        return query
+
+    def search_tasks(self, filters, profile='list', limit=None, after=None):
+        return list(self.iter_search_tasks(filters, profile, limit, after))
+
+    def iter_search_tasks(self, filters, profile='list', limit=None, after=None):
+        return self._iter_tasks(self._search_query(filters), profile, limit, after)
+
+    def text_search_tasks(self, text, filters, limit, profile='list'):
+        """Top-k tasks ranked by text relevance over title, description and tags"""
+        query = self._search_query(filters)
+        query['$text'] = {'$search': text}
+        projection = dict(self.PROJECTIONS[profile] or {})
+        projection['score'] = {'$meta': 'textScore'}
+
+        cursor = self.collection.find(query, projection).sort([('score', {'$meta': 'textScore'})]).limit(limit)
+        tasks = list(cursor)
         for task in tasks:
-            task['_id'] = str(task['_id'])
             # Ensure tags is always an array
             if 'tags' not in task:
                 task['tags'] = []
+            task['highlights'] = highlight_document(task, text, self.TEXT_FIELDS)
         return tasks
 
-    def archive_task(self, task_id, user_id):
-        return self.update_task(task_id, {
-            'status': self.STATUS['ARCHIVED']
-        }, user_id)
+    def get_tasks_by_status(self, status, department=None, exclude_archived=False, profile='list', limit=None, after=None):
+        return list(self.iter_tasks_by_status(status, department, exclude_archived, profile, limit, after))
 
-    def get_tasks_by_status(self, status, department=None, exclude_archived=False):
+    def iter_tasks_by_status(self, status, department=None, exclude_archived=False, profile='list', limit=None, after=None):
         query = {'status': status}
         if department:
             query['department'] = department
         if exclude_archived and status != self.STATUS['ARCHIVED']:
             query['status'] = {'$ne': self.STATUS['ARCHIVED']}
             
-        tasks = list(self.collection.find(query).sort('created_at', -1))
-        for task in tasks:
-            task['_id'] = str(task['_id'])
-            # Ensure tags is always an array
-            if 'tags' not in task:
-                task['tags'] = []
-        return tasks
+        return self._iter_tasks(query, profile, limit, after)
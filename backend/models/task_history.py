@@ -0,0 +1,35 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from utils.pagination import keyset_filter
+
+class TaskHistory:
+    """Append-only change history, one document per change, kept outside the task"""
+
+    INDEXES = [
+        IndexModel([('task_id', ASCENDING), ('changed_at', DESCENDING), ('_id', DESCENDING)],
+                   name='task_changed_at')
+    ]
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.task_history
+
+    def record(self, task_id, entries):
+        if not entries:
+            return
+        self.collection.insert_many([dict(entry, task_id=str(task_id)) for entry in entries])
+
+    def record_many(self, changes):
+        """Record (task_id, entries) pairs for several tasks in one insert_many"""
+        documents = [dict(entry, task_id=str(task_id)) for task_id, entries in changes for entry in entries]
+        if documents:
+            self.collection.insert_many(documents)
+
+    def get_task_history(self, task_id, limit=None, after=None):
+        """Changes for a task, newest first, optionally after a (changed_at, _id) cursor"""
+        query = {'task_id': str(task_id)}
+        if after:
+            query = {'$and': [query, keyset_filter(after, 'changed_at')]}
+        cursor = self.collection.find(query).sort([('changed_at', DESCENDING), ('_id', DESCENDING)])
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
@@ -1,11 +1,11 @@
-<<<<<<< HEAD
-from bson import ObjectId
-from pymongo import MongoClient
-import bcrypt
-=======
 from datetime import datetime
 from bson import ObjectId
->>>>>>> 6b90a5a00dcd86f68ebde68c19fd0aea2b7a4cbf
+from pymongo import ReturnDocument, IndexModel, ASCENDING
+from pymongo.errors import BulkWriteError
+from utils.authorization import mask_for_roles, mask_for_permissions, permissions_for_mask
+from utils.auth_claims import authz_versions, get_claims_user
+from utils.user_cache import user_cache, get_request_user, set_request_user, invalidate_user
+from models.dashboard import DashboardCounters
 
 class User:
     ROLES = {
@@ -24,12 +24,35 @@ class User:
         'ADMIN': 'Administration'
     }
 
+    INDEXES = [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        IndexModel([('department', ASCENDING)], name='department'),
+        IndexModel([('roles', ASCENDING)], name='roles')
+    ]
+
+    # Named field projections applied in the query itself; None means the full document
+    PROJECTIONS = {
+        'list': {'email': 1, 'name': 1, 'department': 1, 'roles': 1, 'is_active': 1},
+        'detail': {'password': 0},
+        'auth': {
+            'email': 1, 'name': 1, 'department': 1, 'roles': 1,
+            'permissions': 1, 'is_active': 1, 'authz_version': 1
+        },
+        'etag': {'updated_at': 1, 'created_at': 1}
+    }
+
+    # Documents per cursor batch when streaming list queries
+    BATCH_SIZE = 500
+
+    # Changes to any of these fields invalidate cached copies of the user
+    AUTHZ_FIELDS = ('roles', 'permissions', 'department', 'is_active')
+
     def __init__(self, db):
         self.db = db
         self.collection = db.users
 
-    def create_user(self, data):
-        user = {
+    def _build_user(self, data):
+        return {
             'email': data['email'],
             'password': data['password'],  # Should be hashed before storing
             'name': data['name'],
@@ -38,141 +61,158 @@ class User:
             'permissions': self._get_permissions_for_roles(data.get('roles', ['staff'])),
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow(),
-            'is_active': True
+            'is_active': True,
+            'authz_version': 0
         }
+
+    def create_user(self, data):
+        user = self._build_user(data)
         result = self.collection.insert_one(user)
         user['_id'] = str(result.inserted_id)
+        DashboardCounters(self.db).user_changed(None, user['department'])
         return user
 
-<<<<<<< HEAD
-    def create_user(self, full_name, email, password, role='user', department=None):
-        """Create a new user with a role and optionally a department."""
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        self.collection.insert_one({
-            'full_name': full_name,
-            'email': email,
-            'password': hashed_password,
-            'role': role,  # Add role field
-            'department': department  # Add department field (nullable)
-        })
-    def get_user_by_email(self, email):
-        """Retrieve user information including role and department."""
-        return self.collection.find_one({'email': email})
-=======
+    def create_users(self, rows):
+        """Insert many users in one unordered batch.
+
+        Returns the number inserted and a list of (index, message) for the rows
+        MongoDB rejected, e.g. duplicate emails.
+        """
+        if not rows:
+            return 0, []
+        users = [self._build_user(data) for data in rows]
+        try:
+            result = self.collection.insert_many(users, ordered=False)
+            inserted, errors = len(result.inserted_ids), []
+        except BulkWriteError as e:
+            details = e.details
+            errors = [(error['index'], error['errmsg']) for error in details.get('writeErrors', [])]
+            inserted = details.get('nInserted', 0)
+
+        counters = DashboardCounters(self.db)
+        failed = {index for index, _ in errors}
+        deltas = {}
+        for index, user in enumerate(users):
+            if index not in failed:
+                counters.user_deltas(deltas, None, user['department'])
+        counters.apply(deltas)
+        return inserted, errors
+
     def get_user_by_email(self, email):
         user = self.collection.find_one({'email': email})
         if user:
             user['_id'] = str(user['_id'])
         return user
->>>>>>> 6b90a5a00dcd86f68ebde68c19fd0aea2b7a4cbf
 
-    def get_user_by_id(self, user_id):
+    def find_existing_emails(self, emails):
+        cursor = self.collection.find({'email': {'$in': list(emails)}}, {'email': 1, '_id': 0})
+        return {user['email'] for user in cursor}
+
+    def get_user_by_id(self, user_id, profile=None):
         try:
-            user = self.collection.find_one({'_id': ObjectId(user_id)})
+            user = self.collection.find_one({'_id': ObjectId(user_id)}, self.PROJECTIONS.get(profile))
             if user:
                 user['_id'] = str(user['_id'])
             return user
         except:
             return None
 
+    def get_cached_user_by_id(self, user_id):
+        """Get a user's auth profile through the request and process caches"""
+        user_id = str(user_id)
+        user = get_request_user(user_id)
+        if user is None:
+            user = user_cache.get(user_id)
+            if user is None:
+                user = self.get_user_by_id(user_id, 'auth')
+                if not user:
+                    return None
+                user['permission_mask'] = mask_for_permissions(user.get('permissions', []))
+                user_cache.set(user_id, user)
+            set_request_user(user_id, user)
+        # Hand out copies so callers can't mutate the cached document
+        return dict(user)
+
+    def get_cached_users_by_ids(self, user_ids):
+        """Auth profiles keyed by string id: cache hits first, then one $in query for the rest"""
+        users, missing = {}, []
+        for user_id in {str(user_id) for user_id in user_ids if user_id}:
+            user = user_cache.get(user_id)
+            if user is not None:
+                users[user_id] = dict(user)
+            elif ObjectId.is_valid(user_id):
+                missing.append(ObjectId(user_id))
+        if missing:
+            for user in self.collection.find({'_id': {'$in': missing}}, self.PROJECTIONS['auth']):
+                user_id = str(user['_id'])
+                user['_id'] = user_id
+                user['permission_mask'] = mask_for_permissions(user.get('permissions', []))
+                user_cache.set(user_id, user)
+                users[user_id] = dict(user)
+        return users
+
+    def get_authenticated_user(self, user_id):
+        """Get the requesting user from token claims when enabled, else from the cache"""
+        user = get_claims_user(str(user_id))
+        if user is not None:
+            return user
+        return self.get_cached_user_by_id(user_id)
+
+    def get_user_summaries(self, user_ids):
+        """Compact {_id, name, department} per string id, for embedding in other documents"""
+        return {
+            user_id: {'_id': user_id, 'name': user.get('name'), 'department': user.get('department')}
+            for user_id, user in self.get_cached_users_by_ids(user_ids).items()
+        }
+
     def update_user(self, user_id, data):
         data['updated_at'] = datetime.utcnow()
         if 'roles' in data:
             data['permissions'] = self._get_permissions_for_roles(data['roles'])
         
-        result = self.collection.update_one(
+        if not any(field in data for field in self.AUTHZ_FIELDS):
+            result = self.collection.update_one(
+                {'_id': ObjectId(user_id)},
+                {'$set': data}
+            )
+            return result.modified_count > 0
+
+        # Bump authz_version so tokens carrying the old claims are rejected
+        previous = self.collection.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$set': data}
+            {'$set': data, '$inc': {'authz_version': 1}},
+            projection={'authz_version': 1, 'department': 1},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        invalidate_user(user_id)
+        if not previous:
+            return False
+        authz_versions.set(str(user_id), (previous.get('authz_version') or 0) + 1)
+        if 'department' in data:
+            DashboardCounters(self.db).user_changed(previous.get('department'), data['department'])
+        return True
 
-    def get_department_users(self, department):
-        users = list(self.collection.find({'department': department}))
-        for user in users:
-            user['_id'] = str(user['_id'])
-        return users
+    def _iter_users(self, query, profile):
+        cursor = self.collection.find(query, self.PROJECTIONS[profile]).batch_size(self.BATCH_SIZE)
+        return iter(cursor)
 
-    def get_users_by_role(self, role):
-        users = list(self.collection.find({'roles': role}))
-        for user in users:
-            user['_id'] = str(user['_id'])
-        return users
+    def iter_all_users(self, profile='list'):
+        return self._iter_users({}, profile)
 
-<<<<<<< HEAD
-class DepartmentModel:
-    def __init__(self, db):
-        self.collection = db.get_collection("departments")
-        
-    def find_by_id(self, department_id):
-        return self.collection.find_one({"_id": ObjectId(department_id)})
-    def create_department(self, name, description):
-        return self.collection.insert_one({"name": name, "description": description})
+    def iter_department_users(self, department, profile='list'):
+        return self._iter_users({'department': department}, profile)
 
-    def get_all_departments(self):
-        return list(self.collection.find())
+    def iter_users_by_role(self, role, profile='list'):
+        return self._iter_users({'roles': role}, profile)
 
-    def update_department(self, department_id, updated_data):
-        return self.collection.update_one({"_id": department_id}, {"$set": updated_data})
+    def get_all_users(self, profile='list'):
+        return list(self.iter_all_users(profile))
 
-    def delete_department(self, department_id):
-        return self.collection.delete_one({"_id": department_id})
-    
-
-class TaskModel:
-    def __init__(self, db):
-        self.collection = db.get_collection("tasks")
+    def get_department_users(self, department, profile='list'):
+        return list(self.iter_department_users(department, profile))
 
-    def create_task(self, department_id, title, status):
-        """Create a task associated with a department."""
-        return self.collection.insert_one({
-            "department_id": department_id,
-            "title": title,
-            "status": status
-        })
+    def get_users_by_role(self, role, profile='list'):
+        return list(self.iter_users_by_role(role, profile))
 
-    def get_tasks_by_department(self, department_id):
-        return list(self.collection.find({"department_id": department_id}))
-
-    def update_task(self, task_id, updated_data):
-        return self.collection.update_one({"_id": task_id}, {"$set": updated_data})
-
-    def delete_task(self, task_id):
-        return self.collection.delete_one({"_id": task_id})
-=======
     def _get_permissions_for_roles(self, roles):
-        permissions = set()
-        
-        for role in roles:
-            if role == self.ROLES['SUPER_ADMIN']:
-                permissions.update([
-                    'manage_users', 'manage_roles', 'manage_departments',
-                    'create_task', 'edit_task', 'delete_task', 'view_all_tasks',
-                    'approve_task', 'generate_reports', 'access_archives',
-                    'view_department_tasks', 'view_assigned_tasks'
-                ])
-            elif role == self.ROLES['ADMIN']:
-                permissions.update([
-                    'manage_users', 'manage_roles',
-                    'create_task', 'edit_task', 'view_all_tasks',
-                    'approve_task', 'generate_reports', 'access_archives',
-                    'view_department_tasks', 'view_assigned_tasks'
-                ])
-            elif role == self.ROLES['DEPARTMENT_HEAD']:
-                permissions.update([
-                    'create_task', 'edit_task', 'view_department_tasks',
-                    'approve_task', 'generate_reports', 'generate_department_reports',
-                    'view_assigned_tasks'
-                ])
-            elif role == self.ROLES['FACULTY']:
-                permissions.update([
-                    'create_task', 'edit_task', 'view_department_tasks',
-                    'approve_task', 'generate_reports', 'view_assigned_tasks'
-                ])
-            elif role == self.ROLES['STAFF']:
-                permissions.update([
-                    'create_task', 'edit_task', 'view_assigned_tasks',
-                    'generate_reports'
-                ])
-                
-        return list(permissions)
->>>>>>> 6b90a5a00dcd86f68ebde68c19fd0aea2b7a4cbf
+        return permissions_for_mask(mask_for_roles(roles))
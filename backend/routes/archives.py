@@ -0,0 +1,60 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.archive import ArchiveModel
+from models.user import User
+from utils.authorization import has_permission
+from utils.segments import SegmentUnavailable
+from utils.streaming import list_response
+
+archives_bp = Blueprint('archives', __name__, url_prefix='/api/archives')
+
+# Initialize db attribute
+archives_bp.db = None
+
+@archives_bp.route('/search', methods=['POST'])
+@jwt_required()
+def search_archives():
+    current_user_id = get_jwt_identity()
+    user_model = User(archives_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+
+    if not has_permission(current_user, 'access_archives'):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    filters = request.get_json() or {}
+
+    # If user doesn't have permission to view all tasks, restrict to their department
+    if not has_permission(current_user, 'view_all_tasks'):
+        filters['department_id'] = current_user['department']
+
+    # Entries come back without their compressed payload, newest first
+    try:
+        archives = ArchiveModel(archives_bp.db).iter_search_archives(filters)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid start_date or end_date'}), 400
+    return list_response(archives), 200
+
+@archives_bp.route('/<archive_id>', methods=['GET'])
+@jwt_required()
+def get_archive(archive_id):
+    """Full archive record, with the task and its history decompressed"""
+    current_user_id = get_jwt_identity()
+    user_model = User(archives_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+
+    if not has_permission(current_user, 'access_archives'):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    try:
+        archive = ArchiveModel(archives_bp.db).get_archive_by_id(archive_id, full=True)
+    except SegmentUnavailable:
+        current_app.logger.exception(f'Cold tier read failed for archive {archive_id}')
+        return jsonify({'error': 'Archive entry is in the cold tier, which is unavailable'}), 503
+    if not archive:
+        return jsonify({'error': 'Archive not found'}), 404
+
+    if not (has_permission(current_user, 'view_all_tasks') or
+            archive.get('department_id') == current_user['department']):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    return jsonify(archive), 200
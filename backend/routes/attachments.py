@@ -0,0 +1,177 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.http import parse_content_range_header, parse_range_header, dump_options_header
+from urllib.parse import quote
+from datetime import datetime
+from models.attachment import Attachment, UploadOffsetMismatch, UploadRangeTooSmall
+from models.task import Task
+from models.user import User
+from utils.authorization import can_view, can_edit_task
+
+attachments_bp = Blueprint('attachments', __name__, url_prefix='/api/tasks')
+
+# Initialize db attribute
+attachments_bp.db = None
+
+def _attachment_ref(stored_file, filename, content_type, user_id):
+    """Lightweight reference kept in the task's attachments array"""
+    return {
+        'attachment_id': stored_file['_id'],
+        'filename': filename,
+        'content_type': content_type,
+        'size': stored_file['size'],
+        'uploaded_by': user_id,
+        'uploaded_at': datetime.utcnow()
+    }
+
+def _upload_status(upload):
+    return {
+        'upload_id': upload['_id'],
+        'size': upload['size'],
+        'chunk_size': upload['chunk_size'],
+        'received': upload['received'],
+        'status': upload['status']
+    }
+
+def _content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return dump_options_header('attachment', {'filename': filename})
+    except UnicodeEncodeError:
+        return dump_options_header('attachment', {'filename*': "UTF-8''" + quote(filename)})
+
+@attachments_bp.route('/<task_id>/attachments', methods=['POST'])
+@jwt_required()
+def start_upload(task_id):
+    current_user_id = get_jwt_identity()
+    user_model = User(attachments_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+
+    task = Task(attachments_bp.db).get_task_by_id(task_id, 'attachments')
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    if not can_edit_task(current_user, task):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    data = request.get_json()
+    if not data or not data.get('filename') or 'size' not in data:
+        return jsonify({'error': 'Missing required fields'}), 400
+    size = data['size']
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'error': 'size must be a positive integer'}), 400
+    if size > current_app.config['ATTACHMENT_MAX_SIZE']:
+        return jsonify({'error': 'File too large'}), 413
+
+    upload = Attachment(attachments_bp.db).start_upload(
+        task_id, data['filename'], data.get('content_type'), size, current_user_id,
+        chunk_size=current_app.config['ATTACHMENT_CHUNK_SIZE']
+    )
+    return jsonify(_upload_status(upload)), 201
+
+@attachments_bp.route('/<task_id>/attachments/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(task_id, upload_id):
+    current_user_id = get_jwt_identity()
+
+    upload = Attachment(attachments_bp.db).get_file(upload_id, {'chunks': 0})
+    if not upload or upload.get('task_id') != task_id:
+        return jsonify({'error': 'Upload not found'}), 404
+    if upload['uploaded_by'] != current_user_id:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    return jsonify(_upload_status(upload)), 200
+
+@attachments_bp.route('/<task_id>/attachments/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(task_id, upload_id):
+    """Append bytes to an upload; Content-Range gives their position in the file.
+
+    The body is read from the request stream chunk by chunk. The response
+    reports the committed offset to resume from; once every byte has arrived
+    the file is finalized and referenced from the task.
+    """
+    current_user_id = get_jwt_identity()
+    attachment_model = Attachment(attachments_bp.db)
+
+    upload = attachment_model.get_file(upload_id)
+    if not upload or upload.get('task_id') != task_id:
+        return jsonify({'error': 'Upload not found'}), 404
+    if upload['uploaded_by'] != current_user_id:
+        return jsonify({'error': 'Permission denied'}), 403
+    if upload['status'] == Attachment.STATUS['COMPLETE']:
+        return jsonify({'error': 'Upload already completed'}), 409
+
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if not content_range or content_range.units != 'bytes' or content_range.length != upload['size']:
+        return jsonify({'error': 'Invalid Content-Range header'}), 400
+
+    try:
+        received = attachment_model.append(
+            upload, content_range.start, request.stream, content_range.stop - content_range.start
+        )
+    except UploadOffsetMismatch as e:
+        return jsonify({'error': str(e), 'received': e.received}), 409
+    except UploadRangeTooSmall as e:
+        return jsonify({'error': str(e), 'chunk_size': e.chunk_size}), 400
+
+    if received < upload['size']:
+        upload['received'] = received
+        return jsonify(_upload_status(upload)), 200
+
+    stored_file = attachment_model.complete(upload_id)
+    ref = _attachment_ref(stored_file, upload['filename'], upload['content_type'], current_user_id)
+    task = Task(attachments_bp.db).update_task(task_id, {'attachments': [ref]}, current_user_id)
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+
+    return jsonify(ref), 201
+
+@attachments_bp.route('/<task_id>/attachments/<attachment_id>', methods=['GET'])
+@jwt_required()
+def download_attachment(task_id, attachment_id):
+    current_user_id = get_jwt_identity()
+    user_model = User(attachments_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+
+    task = Task(attachments_bp.db).get_task_by_id(task_id, 'attachments')
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    if not can_view(current_user, task, 'task'):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    ref = next((ref for ref in task.get('attachments', [])
+                if isinstance(ref, dict) and ref.get('attachment_id') == attachment_id), None)
+    attachment_model = Attachment(attachments_bp.db)
+    stored_file = attachment_model.get_file(attachment_id) if ref else None
+    if not stored_file or stored_file['status'] != Attachment.STATUS['COMPLETE']:
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    size = stored_file['size']
+    etag = f'"{stored_file["digest"]}"'
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Content-Disposition': _content_disposition(ref['filename'])
+    }
+
+    # A single satisfiable range gets a 206; multiple ranges or a stale If-Range get the whole file
+    start, stop, status = 0, size, 200
+    ranges = parse_range_header(request.headers.get('Range'))
+    if_range = request.headers.get('If-Range')
+    if ranges and (not if_range or if_range == etag) and len(ranges.ranges) == 1:
+        bounds = ranges.range_for_length(size)
+        if bounds is None:
+            headers['Content-Range'] = f'bytes */{size}'
+            return jsonify({'error': 'Range not satisfiable'}), 416, headers
+        start, stop = bounds
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+
+    headers['Content-Length'] = str(stop - start)
+    return Response(
+        attachment_model.iter_range(stored_file, start, stop),
+        status=status,
+        mimetype=ref.get('content_type') or 'application/octet-stream',
+        headers=headers,
+        direct_passthrough=True
+    )
@@ -1,214 +1,95 @@
-from flask import Blueprint, request, jsonify, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.report import Report
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import (
+    jwt_required, get_jwt_identity, create_access_token, create_refresh_token
+)
 from models.user import User
-from datetime import datetime
-import json
-import io
-import csv
+from utils.auth_claims import claims_enabled, build_claims
+from utils.passwords import password_hasher, PasswordPoolBusy
 
-reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
+auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 # Initialize db attribute
-reports_bp.db = None
+auth_bp.db = None
 
-def has_permission(user, permission):
-    return permission in user.get('permissions', [])
+def _create_access_token(user_model, user):
+    additional_claims = None
+    if claims_enabled():
+        permissions = user_model._get_permissions_for_roles(user.get('roles', []))
+        additional_claims = build_claims(user, permissions)
+    return create_access_token(identity=user['_id'], additional_claims=additional_claims)
 
-@reports_bp.route('', methods=['GET'])  # No trailing slash
-@reports_bp.route('/', methods=['GET'])  # With trailing slash
-@jwt_required()
-def get_reports():
-    current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    if not has_permission(current_user, 'generate_reports'):
-        return jsonify({'error': 'Permission denied'}), 403
-    
-    report_model = Report(reports_bp.db)
-    reports = report_model.get_templates()
-    
-    return jsonify(reports), 200
-
-@reports_bp.route('/templates', methods=['GET'])
-@jwt_required()
-def get_report_templates():
-    current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    if not has_permission(current_user, 'generate_reports'):
-        return jsonify({'error': 'Permission denied'}), 403
-    
-    report_model = Report(reports_bp.db)
-    templates = report_model.get_templates()
-    
-    return jsonify(templates), 200
-
-@reports_bp.route('/templates', methods=['POST'])
-@jwt_required()
-def create_report_template():
-    current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    if not has_permission(current_user, 'manage_roles'):  # Only admins can create templates
-        return jsonify({'error': 'Permission denied'}), 403
-    
+@auth_bp.route('/register', methods=['POST'])
+def register():
     data = request.get_json()
-    required_fields = ['name', 'description', 'type', 'fields', 'layout']
-    if not all(field in data for field in required_fields):
+    required_fields = ['name', 'email', 'password', 'department']
+    if not all(data.get(field) for field in required_fields):
         return jsonify({'error': 'Missing required fields'}), 400
-    
-    report_model = Report(reports_bp.db)
-    template = report_model.create_template(data)
-    
-    return jsonify(template), 201
 
-@reports_bp.route('/generate', methods=['POST'])
-@jwt_required()
-def generate_report():
-    current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    if not has_permission(current_user, 'generate_reports'):
-        return jsonify({'error': 'Permission denied'}), 403
-    
-    data = request.get_json()
-    if 'template' not in data or 'filters' not in data:
-        return jsonify({'error': 'Missing template or filters'}), 400
-    
-    report_model = Report(reports_bp.db)
-    
-    # Handle different report types
-    if data['template'] == Report.TEMPLATES['TASK_SUMMARY']:
-        # For non-admin users, restrict to their department
-        department = None if has_permission(current_user, 'view_all_tasks') else current_user['department']
-        report_data = report_model.generate_task_summary_report(data['filters'], department)
-    
-    elif data['template'] == Report.TEMPLATES['DEPARTMENT_PERFORMANCE']:
-        if not data['filters'].get('department'):
-            return jsonify({'error': 'Department is required for performance report'}), 400
-        
-        # Check if user has permission for the requested department
-        if not (has_permission(current_user, 'view_all_tasks') or 
-                data['filters']['department'] == current_user['department']):
-            return jsonify({'error': 'Permission denied for requested department'}), 403
-        
-        report_data = report_model.generate_department_performance_report(
-            data['filters']['department'],
-            data['filters'].get('date_range', {
-                'start': datetime.utcnow().replace(day=1),
-                'end': datetime.utcnow()
-            })
-        )
-    else:
-        return jsonify({'error': 'Invalid report template'}), 400
-    
-    if not report_data:
-        return jsonify({'error': 'No data available for the specified filters'}), 404
-    
-    # Create report record
-    report = report_model.create_report({
-        'title': data.get('title', f"Report {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"),
-        'template': data['template'],
-        'filters': data['filters'],
-        'data': report_data,
-        'department': current_user['department'] if not has_permission(current_user, 'view_all_tasks') else None
-    }, current_user_id)
-    
-    return jsonify(report), 201
-
-@reports_bp.route('/<report_id>', methods=['GET'])
-@jwt_required()
-def get_report(report_id):
-    current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    report_model = Report(reports_bp.db)
-    report = report_model.get_report_by_id(report_id)
-    
-    if not report:
-        return jsonify({'error': 'Report not found'}), 404
-    
-    # Check permissions
-    if not (has_permission(current_user, 'view_all_tasks') or
-            report['department'] == current_user['department'] or
-            report['generated_by'] == current_user_id):
-        return jsonify({'error': 'Permission denied'}), 403
-    
-    return jsonify(report), 200
-
-@reports_bp.route('/<report_id>/export', methods=['GET'])
-@jwt_required()
-def export_report(report_id):
+    if data['department'] not in User.DEPARTMENTS.keys():
+        return jsonify({'error': 'Invalid department'}), 400
+
+    user_model = User(auth_bp.db)
+    if user_model.get_user_by_email(data['email']):
+        return jsonify({'error': 'User already exists'}), 400
+
+    user = user_model.create_user({
+        'name': data['name'],
+        'email': data['email'],
+        'password': password_hasher.hash(data['password']),
+        'department': data['department']
+    })
+    del user['password']
+    return jsonify(user), 201
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    data = request.get_json() or {}
+    email = data.get('email')
+    password = data.get('password')
+    if not email or not password:
+        return jsonify({'error': 'Email and password are required'}), 400
+
+    user_model = User(auth_bp.db)
+    user = user_model.get_user_by_email(email)
+    if not user or not password_hasher.check(password, user['password']):
+        return jsonify({'error': 'Invalid email or password'}), 401
+
+    if not user.get('is_active', True):
+        return jsonify({'error': 'Account is disabled'}), 403
+
+    # Upgrade the stored hash when the configured cost factor has changed
+    if password_hasher.needs_rehash(user['password']):
+        try:
+            user_model.update_user(user['_id'], {'password': password_hasher.hash(password)})
+        except PasswordPoolBusy:
+            pass  # Try again on a later login
+
+    del user['password']
+    return jsonify({
+        'access_token': _create_access_token(user_model, user),
+        'refresh_token': create_refresh_token(identity=user['_id']),
+        'user': user
+    }), 200
+
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
     current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    report_model = Report(reports_bp.db)
-    report = report_model.get_report_by_id(report_id)
-    
-    if not report:
-        return jsonify({'error': 'Report not found'}), 404
-    
-    # Check permissions
-    if not (has_permission(current_user, 'view_all_tasks') or
-            report['department'] == current_user['department'] or
-            report['generated_by'] == current_user_id):
-        return jsonify({'error': 'Permission denied'}), 403
-    
-    # Get export format
-    export_format = request.args.get('format', 'csv')
-    
-    if export_format == 'csv':
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write headers
-        if isinstance(report['data'], dict):
-            writer.writerow(report['data'].keys())
-            writer.writerow(report['data'].values())
-        elif isinstance(report['data'], list):
-            if report['data']:
-                writer.writerow(report['data'][0].keys())
-                for row in report['data']:
-                    writer.writerow(row.values())
-        
-        output.seek(0)
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f"report_{report_id}.csv"
-        )
-    
-    elif export_format == 'json':
-        return send_file(
-            io.BytesIO(json.dumps(report['data'], default=str).encode('utf-8')),
-            mimetype='application/json',
-            as_attachment=True,
-            download_name=f"report_{report_id}.json"
-        )
-    
-    else:
-        return jsonify({'error': 'Unsupported export format'}), 400
-
-@reports_bp.route('/department/<department>', methods=['GET'])
+    user_model = User(auth_bp.db)
+    # Always reload from the database so refreshed claims are current
+    user = user_model.get_user_by_id(current_user_id, 'auth')
+    if not user or not user.get('is_active', True):
+        return jsonify({'error': 'User not found'}), 401
+
+    return jsonify({'access_token': _create_access_token(user_model, user)}), 200
+
+@auth_bp.route('/me', methods=['GET'])
 @jwt_required()
-def get_department_reports(department):
+def me():
     current_user_id = get_jwt_identity()
-    user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
-    
-    if not (has_permission(current_user, 'view_all_tasks') or
-            current_user['department'] == department):
-        return jsonify({'error': 'Permission denied'}), 403
-    
-    report_model = Report(reports_bp.db)
-    reports = report_model.get_department_reports(department)
-    
-    return jsonify(reports), 200
+    user_model = User(auth_bp.db)
+    user = user_model.get_cached_user_by_id(current_user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    return jsonify(user), 200
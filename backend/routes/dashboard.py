@@ -0,0 +1,49 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.dashboard import DashboardCounters
+from models.task import Task
+from models.user import User
+from utils.authorization import has_permission
+from utils.due_dates import due_date_scheduler
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+# Initialize db attribute
+dashboard_bp.db = None
+
+@dashboard_bp.route('', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """Task counts by status, user counts and overdue counts per department, from the counters"""
+    current_user_id = get_jwt_identity()
+    user_model = User(dashboard_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+
+    # Users without view_all_tasks only see their own department
+    department = None if has_permission(current_user, 'view_all_tasks') else current_user['department']
+    counters = DashboardCounters(dashboard_bp.db).get_counters(department)
+
+    if due_date_scheduler.running:
+        overdue = due_date_scheduler.overdue_counts()
+    else:
+        overdue = Task(dashboard_bp.db).count_overdue_by_department()
+
+    departments = {}
+    totals = {'tasks': 0, 'users': 0, 'overdue': 0, 'status': {}}
+    for counter in counters:
+        entry = departments.setdefault(counter['department'], {'tasks': 0, 'users': 0, 'status': {}})
+        if counter['kind'] == 'tasks':
+            entry['tasks'] = counter.get('total', 0)
+            entry['status'] = {status: count for status, count in counter.get('status', {}).items() if count}
+            for status, count in entry['status'].items():
+                totals['status'][status] = totals['status'].get(status, 0) + count
+        else:
+            entry['users'] = counter.get('total', 0)
+
+    for name, entry in departments.items():
+        entry['overdue'] = overdue.get(name, 0)
+        totals['tasks'] += entry['tasks']
+        totals['users'] += entry['users']
+        totals['overdue'] += entry['overdue']
+
+    return jsonify({'departments': departments, 'totals': totals}), 200
@@ -1,9 +1,11 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, current_app, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.report import Report
 from models.user import User
+from utils.authorization import has_permission, can_view
+from utils.streaming import list_response
+from utils.etags import timestamp_etag, if_none_match, cache_headers, not_modified
 from datetime import datetime
-import json
 import io
 import csv
 
@@ -12,16 +14,13 @@ reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 # Initialize db attribute
 reports_bp.db = None
 
-def has_permission(user, permission):
-    return permission in user.get('permissions', [])
-
 @reports_bp.route('', methods=['GET'])  # No trailing slash
 @reports_bp.route('/', methods=['GET'])  # With trailing slash
 @jwt_required()
 def get_reports():
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'generate_reports'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -36,7 +35,7 @@ def get_reports():
 def get_report_templates():
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'generate_reports'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -51,7 +50,7 @@ def get_report_templates():
 def create_report_template():
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'manage_roles'):  # Only admins can create templates
         return jsonify({'error': 'Permission denied'}), 403
@@ -71,7 +70,7 @@ def create_report_template():
 def generate_report():
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'generate_reports'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -126,28 +125,36 @@ def generate_report():
 def get_report(report_id):
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     report_model = Report(reports_bp.db)
+    
+    # Revalidation skips loading the report data; created_at is enough to version it
+    if_none_match_header = request.headers.get('If-None-Match')
+    if if_none_match_header:
+        stamp = report_model.get_report_by_id(report_id, 'etag')
+        if stamp and can_view(current_user, stamp, 'report'):
+            etag = timestamp_etag(stamp.get('created_at'))
+            if if_none_match(if_none_match_header, etag):
+                return not_modified(etag)
+    
     report = report_model.get_report_by_id(report_id)
     
     if not report:
         return jsonify({'error': 'Report not found'}), 404
     
     # Check permissions
-    if not (has_permission(current_user, 'view_all_tasks') or
-            report['department'] == current_user['department'] or
-            report['generated_by'] == current_user_id):
+    if not can_view(current_user, report, 'report'):
         return jsonify({'error': 'Permission denied'}), 403
     
-    return jsonify(report), 200
+    return jsonify(report), 200, cache_headers(timestamp_etag(report.get('created_at')))
 
 @reports_bp.route('/<report_id>/export', methods=['GET'])
 @jwt_required()
 def export_report(report_id):
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     report_model = Report(reports_bp.db)
     report = report_model.get_report_by_id(report_id)
@@ -156,9 +163,7 @@ def export_report(report_id):
         return jsonify({'error': 'Report not found'}), 404
     
     # Check permissions
-    if not (has_permission(current_user, 'view_all_tasks') or
-            report['department'] == current_user['department'] or
-            report['generated_by'] == current_user_id):
+    if not can_view(current_user, report, 'report'):
         return jsonify({'error': 'Permission denied'}), 403
     
     # Get export format
@@ -188,7 +193,7 @@ def export_report(report_id):
     
     elif export_format == 'json':
         return send_file(
-            io.BytesIO(json.dumps(report['data'], default=str).encode('utf-8')),
+            io.BytesIO(current_app.json.dumps(report['data']).encode('utf-8')),
             mimetype='application/json',
             as_attachment=True,
             download_name=f"report_{report_id}.json"
@@ -202,13 +207,13 @@ def export_report(report_id):
 def get_department_reports(department):
     current_user_id = get_jwt_identity()
     user_model = User(reports_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not (has_permission(current_user, 'view_all_tasks') or
             current_user['department'] == department):
         return jsonify({'error': 'Permission denied'}), 403
     
     report_model = Report(reports_bp.db)
-    reports = report_model.get_department_reports(department)
+    reports = report_model.iter_department_reports(department)
     
-    return jsonify(reports), 200
+    return list_response(reports), 200
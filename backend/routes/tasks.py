@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.task import Task
+from models.task import Task, VersionConflict
 from models.user import User
+from models.task_history import TaskHistory
+from models.comment import Comment
+from utils.authorization import has_permission, can_view, can_edit_task
+from utils.streaming import wants_ndjson, wants_expand, ndjson_response, batched
+from utils.etags import version_etag, parse_if_match, if_none_match, cache_headers, not_modified
+from utils.due_dates import due_date_scheduler
+from utils.events import task_events
+from utils.pagination import parse_page_args, page_response, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from datetime import datetime
 import json
 
@@ -10,8 +18,69 @@ tasks_bp = Blueprint('tasks', __name__, url_prefix='/api/tasks')
 # Initialize db attribute
 tasks_bp.db = None
 
-def has_permission(user, permission):
-    return permission in user.get('permissions', [])
+# History entries embedded in GET /api/tasks/<id>; older ones via /history
+RECENT_HISTORY_SIZE = 50
+
+# Seconds between keep-alive comments on an idle event stream
+EVENT_HEARTBEAT = 15
+
+# Task fields holding user ids that ?expand=users resolves to summaries
+USER_FIELDS = ('created_by', 'assigned_to')
+
+# Tasks hydrated per $in lookup when streaming with ?expand=users
+EXPAND_BATCH_SIZE = 200
+
+def _write_response(write):
+    """Run a versioned task write, honouring If-Match and returning the new ETag"""
+    try:
+        expected_version = parse_if_match(request.headers.get('If-Match'))
+    except ValueError:
+        return jsonify({'error': 'Invalid If-Match header'}), 400
+    
+    try:
+        task = write(expected_version)
+    except VersionConflict as e:
+        # 412 only answers a failed If-Match; otherwise the write lost to concurrent changes
+        return jsonify({'error': str(e), 'version': e.version}), 412 if expected_version is not None else 409
+    
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    return jsonify(task), 200, {'ETag': version_etag(task.get('version'))}
+
+def _expand_users(tasks):
+    """Embed <field>_user summaries for created_by/assigned_to, resolved with one batched lookup"""
+    summaries = User(tasks_bp.db).get_user_summaries(
+        task.get(field) for task in tasks for field in USER_FIELDS
+    )
+    for task in tasks:
+        for field in USER_FIELDS:
+            if task.get(field):
+                task[f'{field}_user'] = summaries.get(str(task[field]))
+    return tasks
+
+def _iter_expanded(tasks):
+    for batch in batched(tasks, EXPAND_BATCH_SIZE):
+        yield from _expand_users(batch)
+
+def _task_list_response(fetch):
+    """Return a plain list, an NDJSON stream, or a cursor page when limit/cursor are requested"""
+    try:
+        limit, after = parse_page_args(request.args)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    expand_users = wants_expand('users')
+    if wants_ndjson():
+        tasks = fetch(limit, after)
+        return ndjson_response(_iter_expanded(tasks) if expand_users else tasks)
+    
+    tasks = list(fetch(limit, after))
+    if expand_users:
+        _expand_users(tasks)
+    if limit is None:
+        return jsonify(tasks), 200
+    return jsonify(page_response(tasks, limit, 'tasks')), 200
 
 @tasks_bp.route('', methods=['POST'])  # No trailing slash
 @tasks_bp.route('/', methods=['POST'])  # With trailing slash
@@ -19,7 +88,7 @@ def has_permission(user, permission):
 def create_task():
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'create_task'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -39,63 +108,251 @@ def create_task():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Upper bound on operations accepted by POST /api/tasks/bulk
+MAX_BULK_OPERATIONS = 1000
+
+def _check_bulk_operation(current_user, current_user_id, operation, tasks, seen):
+    """Validate one bulk operation; returns (error, data, current_task)"""
+    op = operation.get('op')
+    if op == 'create':
+        data = operation.get('data')
+        if not has_permission(current_user, 'create_task'):
+            return 'Permission denied', None, None
+        if not isinstance(data, dict) or not all(field in data for field in ['title', 'description', 'department']):
+            return 'Missing required fields', None, None
+        return None, dict(data, created_by=current_user_id), None
+
+    if op not in ('update', 'approve', 'archive'):
+        return 'Unknown operation', None, None
+
+    task_id = operation.get('task_id')
+    if not isinstance(task_id, str):
+        return 'Invalid task_id', None, None
+    task = tasks.get(task_id)
+    if not task:
+        return 'Task not found', None, None
+    if task_id in seen:
+        return 'Task appears more than once in the batch', None, None
+    seen.add(task_id)
+
+    if op == 'update':
+        data = operation.get('data')
+        if not isinstance(data, dict):
+            return 'Missing update data', None, None
+        if not can_edit_task(current_user, task):
+            return 'Permission denied', None, None
+    elif op == 'approve':
+        if not has_permission(current_user, 'approve_task'):
+            return 'Permission denied', None, None
+        if task['status'] != Task.STATUS['PENDING_APPROVAL']:
+            return 'Task is not pending approval', None, None
+        data = {'status': Task.STATUS['DONE']}
+    else:
+        if not has_permission(current_user, 'access_archives'):
+            return 'Permission denied', None, None
+        # Archived tasks move out of the collection rather than being updated
+        data = None
+
+    if 'version' in operation and operation['version'] != (task.get('version') or 0):
+        return str(VersionConflict()), None, None
+    return None, data, task
+
+@tasks_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_tasks():
+    current_user_id = get_jwt_identity()
+    user_model = User(tasks_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    operations = (request.get_json() or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'No operations given'}), 400
+    if len(operations) > MAX_BULK_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BULK_OPERATIONS} operations per request'}), 400
+    if not all(isinstance(operation, dict) for operation in operations):
+        return jsonify({'error': 'Invalid operation'}), 400
+    
+    # One read for every task the batch touches, then check permissions in one pass
+    task_model = Task(tasks_bp.db)
+    tasks = task_model.get_tasks_by_ids(
+        {str(operation.get('task_id')) for operation in operations if operation.get('op') != 'create'}
+    )
+    
+    results = {}
+    creates = []
+    updates = []
+    archives = {}
+    seen = set()
+    for index, operation in enumerate(operations):
+        error, data, task = _check_bulk_operation(current_user, current_user_id, operation, tasks, seen)
+        if error:
+            results[index] = {'error': error}
+        elif task is None:
+            creates.append((index, data))
+        elif data is None:
+            archives[index] = task
+        else:
+            updates.append((index, task, data))
+    
+    results.update(task_model.bulk_write_tasks(creates, updates, current_user_id))
+    if archives:
+        archived = task_model.archive_tasks(
+            {task['_id']: task.get('version') for task in archives.values()}, current_user_id
+        )
+        for index, task in archives.items():
+            if task['_id'] in archived:
+                results[index] = {'task_id': task['_id'], 'archived': True}
+            else:
+                results[index] = {'error': str(VersionConflict())}
+    
+    response = []
+    for index, operation in enumerate(operations):
+        result = dict(results[index], index=index, op=operation.get('op'))
+        result['status'] = 'error' if 'error' in result else 'ok'
+        response.append(result)
+    return jsonify({'results': response}), 200
+
 @tasks_bp.route('/<task_id>', methods=['GET'])
 @jwt_required()
 def get_task(task_id):
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     task_model = Task(tasks_bp.db)
+    
+    # Revalidation only needs the version, so answer 304 from a projected read
+    if_none_match_header = request.headers.get('If-None-Match')
+    if if_none_match_header:
+        stamp = task_model.get_task_by_id(task_id, 'etag')
+        if stamp and can_view(current_user, stamp, 'task'):
+            etag = version_etag(stamp.get('version'))
+            if if_none_match(if_none_match_header, etag):
+                return not_modified(etag)
+    
     task = task_model.get_task_by_id(task_id)
     
     if not task:
         return jsonify({'error': 'Task not found'}), 404
     
     # Check permissions
-    if not (has_permission(current_user, 'view_all_tasks') or
-            task['department'] == current_user['department'] or
-            task['created_by'] == current_user_id or
-            task.get('assigned_to') == current_user_id):
+    if not can_view(current_user, task, 'task'):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    # Keep the change_log field for existing clients: legacy inline entries plus recent history
+    recent = TaskHistory(tasks_bp.db).get_task_history(task_id, limit=RECENT_HISTORY_SIZE)
+    task['change_log'] = task.get('change_log', []) + recent[::-1]
+    
+    return jsonify(task), 200, cache_headers(version_etag(task.get('version')))
+
+@tasks_bp.route('/<task_id>/history', methods=['GET'])
+@jwt_required()
+def get_task_history(task_id):
+    current_user_id = get_jwt_identity()
+    user_model = User(tasks_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    task_model = Task(tasks_bp.db)
+    task = task_model.get_task_by_id(task_id, 'list')
+    
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    if not can_view(current_user, task, 'task'):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    try:
+        limit, after = parse_page_args(request.args)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    limit = limit or DEFAULT_PAGE_SIZE
+    
+    history = TaskHistory(tasks_bp.db).get_task_history(task_id, limit, after)
+    return jsonify(page_response(history, limit, 'history', 'changed_at')), 200
+
+@tasks_bp.route('/<task_id>/comments', methods=['GET'])
+@jwt_required()
+def get_task_comments(task_id):
+    current_user_id = get_jwt_identity()
+    user_model = User(tasks_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    task_model = Task(tasks_bp.db)
+    task = task_model.get_task_by_id(task_id, 'list')
+    
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    if not can_view(current_user, task, 'task'):
         return jsonify({'error': 'Permission denied'}), 403
     
-    return jsonify(task), 200
+    try:
+        limit, after = parse_page_args(request.args)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    limit = limit or DEFAULT_PAGE_SIZE
+    
+    comment_model = Comment(tasks_bp.db)
+    comments = comment_model.get_comments_by_task_id(task_id, limit, after)
+    comment_model.hydrate_authors(comments, user_model)
+    return jsonify(page_response(comments, limit, 'comments')), 200
+
+@tasks_bp.route('/<task_id>/comments', methods=['POST'])
+@jwt_required()
+def add_task_comment(task_id):
+    current_user_id = get_jwt_identity()
+    user_model = User(tasks_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    task_model = Task(tasks_bp.db)
+    task = task_model.get_task_by_id(task_id, 'list')
+    
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    if not can_view(current_user, task, 'task'):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    data = request.get_json() or {}
+    text = data.get('text') or data.get('comment_text')
+    if not text:
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    comment_model = Comment(tasks_bp.db)
+    comment = comment_model.add_comment(task_id, current_user_id, text)
+    comment_model.hydrate_authors([comment], user_model)
+    return jsonify(comment), 201
 
 @tasks_bp.route('/<task_id>', methods=['PUT'])
 @jwt_required()
 def update_task(task_id):
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     task_model = Task(tasks_bp.db)
-    task = task_model.get_task_by_id(task_id)
+    task = task_model.get_task_by_id(task_id, 'list')
     
     if not task:
         return jsonify({'error': 'Task not found'}), 404
     
     # Check permissions
-    if not (has_permission(current_user, 'edit_task') and
-            (has_permission(current_user, 'view_all_tasks') or
-             task['department'] == current_user['department'] or
-             task['created_by'] == current_user_id or
-             task.get('assigned_to') == current_user_id)):
+    if not can_edit_task(current_user, task):
         return jsonify({'error': 'Permission denied'}), 403
     
     data = request.get_json()
-    updated_task = task_model.update_task(task_id, data, current_user_id)
-    
-    if not updated_task:
-        return jsonify({'error': 'Failed to update task'}), 500
-    
-    return jsonify(updated_task), 200
+    return _write_response(
+        lambda expected_version: task_model.update_task(
+            task_id, data, current_user_id, expected_version, current_task=task
+        )
+    )
 
 @tasks_bp.route('/department/<department>', methods=['GET'])
 @jwt_required()
 def get_department_tasks(department):
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not (has_permission(current_user, 'view_all_tasks') or
             current_user['department'] == department):
@@ -103,33 +360,85 @@ def get_department_tasks(department):
     
     status = request.args.get('status')
     task_model = Task(tasks_bp.db)
-    tasks = task_model.get_department_tasks(department, status)
-    
-    return jsonify(tasks), 200
+    return _task_list_response(
+        lambda limit, after: task_model.iter_department_tasks(department, status, limit=limit, after=after)
+    )
 
 @tasks_bp.route('/status/<status>', methods=['GET'])
 @jwt_required()
 def get_tasks_by_status(status):
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     task_model = Task(tasks_bp.db)
     
     # If user has permission to view all tasks, don't filter by department
-    if has_permission(current_user, 'view_all_tasks'):
-        tasks = task_model.get_tasks_by_status(status)
+    department = None if has_permission(current_user, 'view_all_tasks') else current_user['department']
+    return _task_list_response(
+        lambda limit, after: task_model.iter_tasks_by_status(status, department, limit=limit, after=after)
+    )
+
+@tasks_bp.route('/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])  # EventSource can't send headers
+def task_events_stream():
+    """Server-Sent Events feed of created/updated/approved/archived tasks the caller can view"""
+    current_user_id = get_jwt_identity()
+    user_model = User(tasks_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    subscription = task_events.subscribe(
+        lambda task: can_view(current_user, task, 'task'),
+        request.headers.get('Last-Event-ID')
+    )
+    json = current_app.json
+    
+    def stream():
+        try:
+            yield f'retry: {EVENT_HEARTBEAT * 1000}\n\n'
+            while True:
+                event = subscription.get(EVENT_HEARTBEAT)
+                if subscription.overflowed:
+                    # Too far behind to catch up; the client should refetch and reconnect
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@tasks_bp.route('/overdue/counts', methods=['GET'])
+@jwt_required()
+def get_overdue_counts():
+    current_user_id = get_jwt_identity()
+    user_model = User(tasks_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    # Counts are held in memory by the scheduler; fall back to an aggregate when it isn't running
+    if due_date_scheduler.running:
+        counts = due_date_scheduler.overdue_counts()
     else:
-        tasks = task_model.get_tasks_by_status(status, current_user['department'])
+        counts = Task(tasks_bp.db).count_overdue_by_department()
+    
+    if not has_permission(current_user, 'view_all_tasks'):
+        department = current_user['department']
+        counts = {department: counts.get(department, 0)}
     
-    return jsonify(tasks), 200
+    return jsonify(counts), 200
 
 @tasks_bp.route('/search', methods=['POST'])
 @jwt_required()
 def search_tasks():
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     filters = request.get_json()
     
@@ -138,22 +447,32 @@ def search_tasks():
         filters['department'] = current_user['department']
     
     task_model = Task(tasks_bp.db)
-    tasks = task_model.search_tasks(filters)
     
-    return jsonify(tasks), 200
+    # Full-text mode: relevance-ranked top-k with highlighted snippets
+    text = filters.pop('q', None)
+    if text:
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        tasks = task_model.text_search_tasks(text, filters, max(1, min(limit, MAX_PAGE_SIZE)))
+        if wants_expand('users'):
+            _expand_users(tasks)
+        return jsonify(tasks), 200
+    
+    return _task_list_response(
+        lambda limit, after: task_model.iter_search_tasks(filters, limit=limit, after=after)
+    )
 
 @tasks_bp.route('/<task_id>/approve', methods=['POST'])
 @jwt_required()
 def approve_task(task_id):
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'approve_task'):
         return jsonify({'error': 'Permission denied'}), 403
     
     task_model = Task(tasks_bp.db)
-    task = task_model.get_task_by_id(task_id)
+    task = task_model.get_task_by_id(task_id, 'list')
     
     if not task:
         return jsonify({'error': 'Task not found'}), 404
@@ -161,28 +480,40 @@ def approve_task(task_id):
     if task['status'] != Task.STATUS['PENDING_APPROVAL']:
         return jsonify({'error': 'Task is not pending approval'}), 400
     
-    updated_task = task_model.update_task(
-        task_id,
-        {'status': Task.STATUS['DONE']},
-        current_user_id
+    return _write_response(
+        lambda expected_version: task_model.update_task(
+            task_id,
+            {'status': Task.STATUS['DONE']},
+            current_user_id,
+            expected_version,
+            current_task=task,
+            precondition={'status': Task.STATUS['PENDING_APPROVAL']}
+        )
     )
-    
-    return jsonify(updated_task), 200
 
 @tasks_bp.route('/<task_id>/archive', methods=['POST'])
 @jwt_required()
 def archive_task(task_id):
     current_user_id = get_jwt_identity()
     user_model = User(tasks_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'access_archives'):
         return jsonify({'error': 'Permission denied'}), 403
     
-    task_model = Task(tasks_bp.db)
-    task = task_model.archive_task(task_id, current_user_id)
+    try:
+        expected_version = parse_if_match(request.headers.get('If-Match'))
+    except ValueError:
+        return jsonify({'error': 'Invalid If-Match header'}), 400
     
-    if not task:
-        return jsonify({'error': 'Failed to archive task'}), 500
+    # The task moves out of the tasks collection, so the archive entry is returned instead
+    try:
+        archive = Task(tasks_bp.db).archive_task(task_id, current_user_id, expected_version)
+    except VersionConflict as e:
+        # As in _write_response: 412 only answers a failed If-Match
+        return jsonify({'error': str(e), 'version': e.version}), 412 if expected_version is not None else 409
+    
+    if not archive:
+        return jsonify({'error': 'Task not found'}), 404
     
-    return jsonify(task), 200
+    return jsonify(archive), 200
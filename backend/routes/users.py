@@ -1,22 +1,25 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user import User
-import bcrypt
+from utils.authorization import has_permission
+from utils.passwords import password_hasher
+from utils.streaming import list_response
+from utils.etags import timestamp_etag, if_none_match, cache_headers, not_modified
+import csv
+import io
+import json
 
 users_bp = Blueprint('users', __name__)
 
 # Initialize db attribute
 users_bp.db = None
 
-def has_permission(user, permission):
-    return permission in user.get('permissions', [])
-
 @users_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_users():
     current_user_id = get_jwt_identity()
     user_model = User(users_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'manage_users'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -25,47 +28,52 @@ def get_users():
     role = request.args.get('role')
     
     if department:
-        users = user_model.get_department_users(department)
+        users = user_model.iter_department_users(department)
     elif role:
-        users = user_model.get_users_by_role(role)
+        users = user_model.iter_users_by_role(role)
     else:
         # Only super admins can view all users
         if 'super_admin' not in current_user['roles']:
             return jsonify({'error': 'Permission denied'}), 403
-        users = list(user_model.collection.find())
-        for user in users:
-            user['_id'] = str(user['_id'])
-            del user['password']
+        users = user_model.iter_all_users()
     
-    return jsonify(users), 200
+    return list_response(users), 200
 
 @users_bp.route('/<user_id>', methods=['GET'])
 @jwt_required()
 def get_user(user_id):
     current_user_id = get_jwt_identity()
     user_model = User(users_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     # Users can view their own profile or admins can view any profile
     if not (user_id == current_user_id or has_permission(current_user, 'manage_users')):
         return jsonify({'error': 'Permission denied'}), 403
     
-    user = user_model.get_user_by_id(user_id)
+    # Revalidation only needs updated_at, so answer 304 from a projected read
+    if_none_match_header = request.headers.get('If-None-Match')
+    if if_none_match_header:
+        stamp = user_model.get_user_by_id(user_id, 'etag')
+        if stamp:
+            etag = timestamp_etag(stamp.get('updated_at') or stamp.get('created_at'))
+            if if_none_match(if_none_match_header, etag):
+                return not_modified(etag)
+    
+    user = user_model.get_user_by_id(user_id, 'detail')
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    del user['password']
-    return jsonify(user), 200
+    return jsonify(user), 200, cache_headers(timestamp_etag(user.get('updated_at') or user.get('created_at')))
 
 @users_bp.route('/<user_id>', methods=['PUT'])
 @jwt_required()
 def update_user(user_id):
     current_user_id = get_jwt_identity()
     user_model = User(users_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     # Check if user exists
-    target_user = user_model.get_user_by_id(user_id)
+    target_user = user_model.get_user_by_id(user_id, 'list')
     if not target_user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -94,18 +102,14 @@ def update_user(user_id):
     
     # Handle password updates
     if 'password' in data:
-        data['password'] = bcrypt.hashpw(
-            data['password'].encode('utf-8'),
-            bcrypt.gensalt()
-        )
+        data['password'] = password_hasher.hash(data['password'])
     
     # Update user
     success = user_model.update_user(user_id, data)
     if not success:
         return jsonify({'error': 'Failed to update user'}), 500
     
-    updated_user = user_model.get_user_by_id(user_id)
-    del updated_user['password']
+    updated_user = user_model.get_user_by_id(user_id, 'detail')
     return jsonify(updated_user), 200
 
 @users_bp.route('/<user_id>/roles', methods=['PUT'])
@@ -113,7 +117,7 @@ def update_user(user_id):
 def update_user_roles(user_id):
     current_user_id = get_jwt_identity()
     user_model = User(users_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'manage_roles'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -123,7 +127,7 @@ def update_user_roles(user_id):
         return jsonify({'error': 'Roles not specified'}), 400
     
     # Check if target user exists
-    target_user = user_model.get_user_by_id(user_id)
+    target_user = user_model.get_user_by_id(user_id, 'list')
     if not target_user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -136,8 +140,7 @@ def update_user_roles(user_id):
     if not success:
         return jsonify({'error': 'Failed to update roles'}), 500
     
-    updated_user = user_model.get_user_by_id(user_id)
-    del updated_user['password']
+    updated_user = user_model.get_user_by_id(user_id, 'detail')
     return jsonify(updated_user), 200
 
 @users_bp.route('/<user_id>/department', methods=['PUT'])
@@ -145,7 +148,7 @@ def update_user_roles(user_id):
 def update_user_department(user_id):
     current_user_id = get_jwt_identity()
     user_model = User(users_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     if not has_permission(current_user, 'manage_users'):
         return jsonify({'error': 'Permission denied'}), 403
@@ -162,8 +165,7 @@ def update_user_department(user_id):
     if not success:
         return jsonify({'error': 'Failed to update department'}), 500
     
-    updated_user = user_model.get_user_by_id(user_id)
-    del updated_user['password']
+    updated_user = user_model.get_user_by_id(user_id, 'detail')
     return jsonify(updated_user), 200
 
 @users_bp.route('/department/<department>', methods=['GET'])
@@ -171,15 +173,113 @@ def update_user_department(user_id):
 def get_department_users(department):
     current_user_id = get_jwt_identity()
     user_model = User(users_bp.db)
-    current_user = user_model.get_user_by_id(current_user_id)
+    current_user = user_model.get_authenticated_user(current_user_id)
     
     # Users can view their own department, admins can view any department
     if not (department == current_user['department'] or 
             has_permission(current_user, 'manage_users')):
         return jsonify({'error': 'Permission denied'}), 403
     
-    users = user_model.get_department_users(department)
-    for user in users:
-        del user['password']
+    users = user_model.iter_department_users(department)
+    
+    return list_response(users), 200
+
+IMPORT_FIELDS = ('email', 'name', 'password', 'department', 'roles')
+IMPORT_CONTENT_TYPES = ('text/csv', 'application/x-ndjson')
+
+def _iter_import_rows(stream, content_type):
+    """Yield (row_number, row) from a CSV or NDJSON upload without buffering it"""
+    # Undecodable bytes become U+FFFD and the row is rejected in _validate_import_row
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8', errors='replace', newline='')
+    if content_type == 'text/csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            # Multiple roles are separated by ';' in CSV
+            roles = row.pop('roles', None)
+            if roles:
+                row['roles'] = [role.strip() for role in roles.split(';') if role.strip()]
+            yield row_number, row
+    else:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError:
+                yield row_number, None
+
+def _validate_import_row(row, allow_super_admin):
+    if not isinstance(row, dict):
+        return 'Invalid row'
+    required = ('email', 'name', 'password', 'department')
+    if not all(row.get(field) for field in required):
+        return 'Missing required fields'
+    if not all(isinstance(row[field], str) for field in required):
+        return 'Invalid field types'
+    if any('\ufffd' in row[field] for field in required):
+        return 'Invalid UTF-8'
+    if row['department'] not in User.DEPARTMENTS.keys():
+        return 'Invalid department'
+    roles = row.get('roles', ['staff'])
+    if (not isinstance(roles, list) or not all(isinstance(role, str) for role in roles)
+            or not set(roles) <= set(User.ROLES.values())):
+        return 'Invalid roles'
+    if 'super_admin' in roles and not allow_super_admin:
+        return 'Permission denied for super_admin role'
+    return None
+
+def _import_batch(user_model, batch, errors):
+    """Hash, de-duplicate and insert one batch of (row_number, row); returns rows inserted"""
+    existing = user_model.find_existing_emails(row['email'] for _, row in batch)
+    pending = []
+    for row_number, row in batch:
+        if row['email'] in existing:
+            errors.append({'row': row_number, 'error': 'User already exists'})
+            continue
+        existing.add(row['email'])
+        pending.append((row_number, row))
+    if not pending:
+        return 0
+
+    hashed = password_hasher.hash_many([row['password'] for _, row in pending])
+    for (_, row), password in zip(pending, hashed):
+        row['password'] = password
+
+    inserted, failed = user_model.create_users([row for _, row in pending])
+    for index, message in failed:
+        errors.append({'row': pending[index][0], 'error': message})
+    return inserted
+
+@users_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_users():
+    current_user_id = get_jwt_identity()
+    user_model = User(users_bp.db)
+    current_user = user_model.get_authenticated_user(current_user_id)
+    
+    if not has_permission(current_user, 'manage_users'):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    content_type = request.mimetype
+    if content_type not in IMPORT_CONTENT_TYPES:
+        return jsonify({'error': 'Expected text/csv or application/x-ndjson'}), 415
+    
+    batch_size = current_app.config['USER_IMPORT_BATCH_SIZE']
+    allow_super_admin = 'super_admin' in current_user['roles']
+    imported = 0
+    errors = []
+    batch = []
+    
+    for row_number, row in _iter_import_rows(request.stream, content_type):
+        error = _validate_import_row(row, allow_super_admin)
+        if error:
+            errors.append({'row': row_number, 'error': error})
+            continue
+        batch.append((row_number, {field: row[field] for field in IMPORT_FIELDS if field in row}))
+        if len(batch) >= batch_size:
+            imported += _import_batch(user_model, batch, errors)
+            batch = []
+    
+    if batch:
+        imported += _import_batch(user_model, batch, errors)
     
-    return jsonify(users), 200
+    return jsonify({'imported': imported, 'failed': len(errors), 'errors': errors}), 200
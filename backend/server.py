@@ -1,8 +1,8 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from pymongo import MongoClient
-import bcrypt
 from bson import ObjectId
+from utils.passwords import password_hasher, PasswordPoolBusy
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
@@ -26,7 +26,7 @@ class UserModel:
         return self.collection.find_one({"email": email})
 
     def create_user(self, full_name, email, password):
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+        hashed_password = password_hasher.hash(password)
         self.collection.insert_one({
             "full_name": full_name,
             "email": email,
@@ -35,7 +35,16 @@ class UserModel:
 
     def check_password(self, email, password):
         user = self.find_by_email(email)
-        if user and bcrypt.checkpw(password.encode("utf-8"), user["password"]):
+        if user and password_hasher.check(password, user["password"]):
+            # Upgrade the stored hash when the configured cost factor has changed
+            if password_hasher.needs_rehash(user["password"]):
+                try:
+                    self.collection.update_one(
+                        {"_id": user["_id"]},
+                        {"$set": {"password": password_hasher.hash(password)}}
+                    )
+                except PasswordPoolBusy:
+                    pass
             return True
         return False
 
@@ -57,6 +66,10 @@ db = MongoDB()
 user_model = UserModel(db)
 department_model = DepartmentModel(db)
 
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    return jsonify({"success": False, "message": "Server busy, please retry"}), 503, {"Retry-After": "1"}
+
 @app.route("/")
 def home():
     return jsonify({"message": "Welcome to the Archival API!"})
@@ -86,9 +99,10 @@ def login():
 
 @app.route("/api/dashboard-stats", methods=["GET"])
 def dashboard_stats():
+    # Collection metadata counts; per-department breakdowns are served by /api/dashboard
     stats = {
-        "total_users": db.get_collection("users").count_documents({}),
-        "total_tasks": db.get_collection("tasks").count_documents({}),
+        "total_users": db.get_collection("users").estimated_document_count(),
+        "total_tasks": db.get_collection("tasks").estimated_document_count(),
     }
     return jsonify({"status": "success", "data": stats})
 @app.route('/api/departments', methods=['GET'])
@@ -0,0 +1,49 @@
+import os
+import sys
+import mongomock
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from pymongo.errors import OperationFailure
+
+# The app imports its packages top-level (from models.task import Task), as when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    # mongomock has no transactions; code 20 is what a standalone server answers
+    def start_session():
+        raise OperationFailure('Transaction numbers are only allowed on a replica set member', 20)
+    db.client.start_session = start_session
+    return db
+
+
+@pytest.fixture
+def app(db):
+    from routes.tasks import tasks_bp
+    from utils.json_provider import OrjsonProvider
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='test-secret-key-that-is-long-enough')
+    app.json = OrjsonProvider(app)
+    JWTManager(app)
+    tasks_bp.db = db
+    app.register_blueprint(tasks_bp)
+    return app
+
+
+@pytest.fixture
+def admin(db):
+    from models.user import User
+    return User(db).create_user({'email': 'admin@example.com', 'password': b'x', 'name': 'Admin',
+                                 'department': 'CSE', 'roles': ['admin']})
+
+
+@pytest.fixture
+def client(app, admin):
+    with app.app_context():
+        token = create_access_token(identity=admin['_id'])
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
@@ -0,0 +1,124 @@
+import weakref
+from datetime import datetime
+import mongomock
+import pytest
+from bson import ObjectId
+from models.archive import ArchiveModel, ArchivePartitions, LEGACY_COLLECTION
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    # mongomock clients on the same host compare equal, so start each test with an empty index cache
+    monkeypatch.setattr(ArchivePartitions, '_indexed', weakref.WeakKeyDictionary())
+    return db
+
+
+@pytest.fixture
+def partitions(db):
+    return ArchivePartitions(db, ArchiveModel.INDEXES)
+
+
+def _index_names(collection):
+    return {index['name'] for index in collection.list_indexes()}
+
+
+def test_name_for_and_collection_for_id(partitions):
+    assert partitions.name_for(datetime(2024, 3, 31, 23, 59)) == 'archives_2024_03'
+    archive_id = ObjectId.from_datetime(datetime(2025, 12, 1))
+    assert partitions.collection_for_id(archive_id).name == 'archives_2025_12'
+
+
+def test_collection_for_creates_indexes(partitions):
+    collection = partitions.collection_for(datetime(2024, 1, 10))
+    assert collection.name == 'archives_2024_01'
+    assert {index.document['name'] for index in ArchiveModel.INDEXES} <= _index_names(collection)
+
+
+def test_collection_for_is_cached_per_database(db, partitions):
+    other = db.client.other
+    partitions.collection_for(datetime(2024, 1, 10))
+    collection = ArchivePartitions(other, ArchiveModel.INDEXES).collection_for(datetime(2024, 1, 10))
+    assert collection.database.name == 'other'
+    assert 'department_archived_at' in _index_names(collection)
+
+
+def test_collection_for_skips_existing_indexes(db, monkeypatch):
+    # Indexed by another process: the miss is resolved by list_indexes alone
+    db.archives_2024_01.create_indexes(ArchiveModel.INDEXES)
+    created = []
+    monkeypatch.setattr(mongomock.Collection, 'create_indexes',
+                        lambda self, indexes, **kwargs: created.append(self.name))
+    ArchivePartitions(db, ArchiveModel.INDEXES).collection_for(datetime(2024, 1, 10))
+    assert created == []
+
+
+def _populate(db, partitions, months):
+    for month in months:
+        partitions.collection_for(month).insert_one({'_id': ObjectId.from_datetime(month), 'archived_at': month})
+
+
+def test_route_prunes_to_covered_months(db, partitions):
+    months = [datetime(2024, month, 1) for month in range(1, 5)]
+    _populate(db, partitions, months)
+
+    collections, legacy = partitions.route(datetime(2024, 2, 15), datetime(2024, 3, 10))
+    assert [c.name for c in collections] == ['archives_2024_03', 'archives_2024_02']
+    assert legacy is None
+
+    collections, _ = partitions.route(end=datetime(2024, 1, 31))
+    assert [c.name for c in collections] == ['archives_2024_01']
+    collections, _ = partitions.route(start=datetime(2024, 4, 1))
+    assert [c.name for c in collections] == ['archives_2024_04']
+    collections, _ = partitions.route()
+    assert len(collections) == 4
+
+
+def test_route_includes_legacy_collection(db, partitions):
+    db[LEGACY_COLLECTION].insert_one({'archived_at': datetime(2020, 1, 1)})
+    _, legacy = partitions.route(datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert legacy.name == LEGACY_COLLECTION
+
+
+def test_drop_before(db, partitions):
+    _populate(db, partitions, [datetime(2024, month, 1) for month in range(1, 5)])
+    assert partitions.drop_before(datetime(2024, 3, 1)) == [datetime(2024, 1, 1), datetime(2024, 2, 1)]
+    assert sorted(name for name in db.list_collection_names() if name.startswith('archives_')) == \
+        ['archives_2024_03', 'archives_2024_04']
+    # A dropped partition gets its indexes again when reused
+    assert 'department_archived_at' in _index_names(partitions.collection_for(datetime(2024, 1, 5)))
+
+
+def test_archive_tasks_prepares_partition_before_transaction(db, monkeypatch):
+    archive_model = ArchiveModel(db)
+    tasks = [{'_id': ObjectId(), 'title': f'Task {i}', 'department': 'CSE', 'version': 1} for i in range(3)]
+    db.tasks.insert_many(tasks)
+    in_transaction = archive_model._in_transaction
+
+    def check(callback):
+        name = archive_model.partitions.name_for(datetime.utcnow())
+        assert name in db.list_collection_names()
+        monkeypatch.setattr(archive_model.partitions, 'collection_for',
+                            lambda date: pytest.fail('partition resolved inside the transaction'))
+        return in_transaction(callback)
+
+    monkeypatch.setattr(archive_model, '_in_transaction', check)
+    moved = archive_model.archive_tasks(tasks, 'system')
+    assert [task['_id'] for task in moved] == [task['_id'] for task in tasks]
+    assert db.tasks.count_documents({}) == 0
+    collections, _ = archive_model.partitions.route()
+    assert sum(collection.count_documents({}) for collection in collections) == 3
+
+
+def test_index_registry_leaves_new_database_without_legacy_source(db, partitions):
+    from utils.indexes import reconcile_indexes
+    partitions.collection_for(datetime(2024, 1, 10))
+    reconcile_indexes(db, ArchiveModel(db).index_registry())
+    assert LEGACY_COLLECTION not in db.list_collection_names()
+    collections, legacy = partitions.route()
+    assert [c.name for c in collections] == ['archives_2024_01']
+    assert legacy is None
+
+
+def test_index_registry_keeps_existing_legacy_collection(db):
+    db[LEGACY_COLLECTION].insert_one({'archived_at': datetime(2020, 1, 1)})
+    assert ArchiveModel(db).index_registry() == {LEGACY_COLLECTION: ArchiveModel.INDEXES}
@@ -0,0 +1,65 @@
+import io
+from datetime import datetime, timedelta
+import mongomock
+import pytest
+from bson import ObjectId
+from models.attachment import Attachment, UploadRangeTooSmall
+
+CHUNK = 4
+
+
+@pytest.fixture
+def attachments():
+    return Attachment(mongomock.MongoClient().db)
+
+
+def _upload(attachments, content):
+    upload = attachments.start_upload(ObjectId(), 'file.bin', None, len(content), 'user', chunk_size=CHUNK)
+    received = attachments.append(upload, 0, io.BytesIO(content), len(content))
+    assert received == len(content)
+    return upload
+
+
+def test_append_rejects_range_smaller_than_a_chunk(attachments):
+    upload = attachments.start_upload(ObjectId(), 'file.bin', None, 10, 'user', chunk_size=CHUNK)
+    with pytest.raises(UploadRangeTooSmall) as raised:
+        attachments.append(upload, 0, io.BytesIO(b'abc'), 3)
+    assert raised.value.chunk_size == CHUNK
+    assert attachments.get_file(upload['_id'])['received'] == 0
+
+
+def test_append_rejects_body_shorter_than_its_range(attachments):
+    upload = attachments.start_upload(ObjectId(), 'file.bin', None, 10, 'user', chunk_size=CHUNK)
+    with pytest.raises(UploadRangeTooSmall):
+        attachments.append(upload, 0, io.BytesIO(b'ab'), 8)
+
+
+def test_append_commits_whole_chunks_and_the_final_piece(attachments):
+    upload = attachments.start_upload(ObjectId(), 'file.bin', None, 10, 'user', chunk_size=CHUNK)
+    # The trailing partial chunk is dropped and resent
+    assert attachments.append(upload, 0, io.BytesIO(b'abcdefg'), 7) == 4
+    upload['received'] = 4
+    assert attachments.append(upload, 4, io.BytesIO(b'efghij'), 6) == 10
+    stored = attachments.complete(upload['_id'])
+    assert b''.join(attachments.iter_range(stored, 0, 10)) == b'abcdefghij'
+
+
+def test_sweep_removes_only_unreferenced_chunks(attachments):
+    kept = _upload(attachments, b'keptshar')
+    attachments.complete(kept['_id'])
+    pending = _upload(attachments, b'pend')
+    abandoned = _upload(attachments, b'gonesharlost')
+    # The TTL index removed the abandoned upload
+    attachments.collection.delete_one({'_id': ObjectId(abandoned['_id'])})
+
+    later = datetime.utcnow() + Attachment.CHUNK_SWEEP_GRACE + timedelta(minutes=1)
+    assert attachments.sweep_chunks(later) == 2
+    remaining = {chunk['_id'] for chunk in attachments.chunks.find()}
+    assert remaining == set(attachments.get_file(kept['_id'])['chunks']) | set(attachments.get_file(pending['_id'])['chunks'])
+
+
+def test_sweep_spares_recently_touched_chunks(attachments):
+    upload = _upload(attachments, b'abcd')
+    attachments.collection.delete_one({'_id': ObjectId(upload['_id'])})
+    assert attachments.sweep_chunks() == 0
+    assert attachments.chunks.count_documents({}) == 1
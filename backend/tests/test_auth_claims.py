@@ -0,0 +1,47 @@
+import time
+from bson import ObjectId
+from models.user import User
+from utils import auth_claims
+from utils.auth_claims import AuthzVersionTable
+
+
+def _tables(db, ttl=60):
+    """One table per simulated process, both backed by the same users collection"""
+    tables = []
+    for _ in range(2):
+        table = AuthzVersionTable()
+        table.load(db.users, ttl)
+        tables.append(table)
+    return tables
+
+
+def _user(db):
+    return db.users.insert_one({'email': 'user@example.com', 'roles': ['staff'], 'department': 'CSE'}).inserted_id
+
+
+def test_bump_in_one_process_reaches_another_after_ttl(db, monkeypatch):
+    user_id = str(_user(db))
+    local, remote = _tables(db)
+    assert remote.is_current(user_id, 0)
+
+    # The other process changes the user's roles and bumps the version
+    db.users.update_one({'_id': ObjectId(user_id)}, {'$inc': {'authz_version': 1}})
+    local.set(user_id, 1)
+    assert not local.is_current(user_id, 0)
+    assert remote.is_current(user_id, 0)
+
+    now = time.monotonic()
+    monkeypatch.setattr(auth_claims.time, 'monotonic', lambda: now + 61)
+    assert not remote.is_current(user_id, 0)
+    assert remote.is_current(user_id, 1)
+
+
+def test_update_user_revokes_claims_everywhere(db, monkeypatch):
+    user_id = str(_user(db))
+    remote = AuthzVersionTable(ttl=0)
+    remote.load(db.users)
+    assert remote.is_current(user_id, 0)
+    monkeypatch.setattr(auth_claims.authz_versions, '_versions', {})
+    User(db).update_user(user_id, {'roles': ['admin']})
+    time.sleep(0.01)
+    assert not remote.is_current(user_id, 0)
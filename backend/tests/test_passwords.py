@@ -0,0 +1,28 @@
+import threading
+import time
+import bcrypt
+from utils.passwords import PasswordHasher
+
+
+def test_hash_many_returns_hashes_in_order():
+    hasher = PasswordHasher(rounds=4, workers=2, max_pending=4)
+    passwords = [f'password-{i}' for i in range(6)]
+    hashed = hasher.hash_many(passwords)
+    assert all(bcrypt.checkpw(p.encode('utf-8'), h) for p, h in zip(passwords, hashed))
+
+
+def test_login_succeeds_while_hash_many_runs():
+    hasher = PasswordHasher(rounds=10, workers=2, max_pending=8)
+    hashed = hasher.hash('secret')
+    importing = threading.Thread(target=hasher.hash_many, args=(['imported'] * 30,))
+    importing.start()
+    logins = 0
+    try:
+        while importing.is_alive() and logins < 10:
+            # Raises PasswordPoolBusy if the import has taken every pending slot
+            assert hasher.check('secret', hashed)
+            logins += 1
+            time.sleep(0.05)
+    finally:
+        importing.join()
+    assert logins > 0
@@ -0,0 +1,92 @@
+import os
+import threading
+import pytest
+from bson import ObjectId
+from utils.segments import SegmentStore, SegmentUnavailable
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(str(tmp_path), max_open=2)
+
+
+def _documents(count):
+    return [{'_id': ObjectId(), 'title': f'Task {i}', 'payload': os.urandom(64)} for i in range(count)]
+
+
+def test_read_returns_every_written_document(store):
+    documents = _documents(50)
+    name, ids = store.write('engineering', '2024-01', iter(documents))
+    assert sorted(ids) == sorted(d['_id'] for d in documents)
+    for document in documents:
+        assert store.read(name, document['_id']) == document
+
+
+def test_read_first_and_last_keys(store):
+    documents = sorted(_documents(10), key=lambda d: d['_id'])
+    name, _ = store.write('engineering', '2024-01', documents)
+    assert store.read(name, documents[0]['_id']) == documents[0]
+    assert store.read(name, documents[-1]['_id']) == documents[-1]
+
+
+def test_read_miss(store):
+    documents = [{'_id': ObjectId(f'{key:024x}')} for key in (0x10, 0x20, 0x30)]
+    name, _ = store.write('engineering', '2024-01', documents)
+    # Before the first key, between two keys and after the last key
+    for key in (0x01, 0x15, 0x40):
+        assert store.read(name, ObjectId(f'{key:024x}')) is None
+
+
+def test_empty_write_leaves_no_segment(store, tmp_path):
+    assert store.write('engineering', '2024-01', iter([])) == (None, [])
+    assert os.listdir(tmp_path / 'engineering') == []
+
+
+def test_generations(store):
+    first, _ = store.write('engineering', '2024-01', _documents(1))
+    second, _ = store.write('engineering', '2024-01', _documents(1))
+    other, _ = store.write('sales/emea', '2024-01', _documents(1))
+    assert first == 'engineering/2024-01.0'
+    assert second == 'engineering/2024-01.1'
+    # The department is quoted into a single directory name
+    assert other == 'sales%2Femea/2024-01.0'
+
+
+def test_concurrent_writers_get_distinct_segments(store):
+    batches = [_documents(20) for _ in range(8)]
+    names = []
+
+    def write(documents):
+        names.append(store.write('engineering', '2024-01', documents)[0])
+
+    threads = [threading.Thread(target=write, args=(documents,)) for documents in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(names)) == len(batches)
+    for documents in batches:
+        name = next(name for name in names if store.read(name, documents[0]['_id']))
+        assert all(store.read(name, d['_id']) == d for d in documents)
+
+
+def test_read_survives_eviction(store):
+    written = [(store.write('engineering', f'2024-0{month}', _documents(2))) for month in range(1, 5)]
+    for _ in range(2):
+        for name, ids in written:
+            assert all(store.read(name, i)['_id'] == i for i in ids)
+
+
+def test_drop_before(store):
+    old, old_ids = store.write('engineering', '2023-12', _documents(1))
+    new, new_ids = store.write('engineering', '2024-01', _documents(1))
+    store.read(old, old_ids[0])
+    store.drop_before('2024-01')
+    with pytest.raises(SegmentUnavailable):
+        store.read(old, old_ids[0])
+    assert store.read(new, new_ids[0])['_id'] == new_ids[0]
+
+
+def test_missing_segment_is_unavailable(store):
+    with pytest.raises(SegmentUnavailable):
+        store.read('engineering/2024-01.0', ObjectId())
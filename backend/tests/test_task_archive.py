@@ -0,0 +1,91 @@
+import pytest
+from pymongo.errors import OperationFailure
+from models.archive import ArchiveModel
+from models.task import Task
+
+
+def _task(db, admin, **fields):
+    return Task(db).create_task(dict({'title': 'Task', 'description': 'Details', 'department': 'CSE',
+                                      'created_by': admin['_id']}, **fields))
+
+
+def test_archive_conflict_without_if_match_is_409(client, db, admin, monkeypatch):
+    task = _task(db, admin)
+    build_archive = ArchiveModel._build_archive
+
+    def racing(self, *args):
+        # A concurrent update lands between the move's read and its guarded delete
+        db.tasks.update_one({}, {'$inc': {'version': 1}})
+        return build_archive(self, *args)
+
+    monkeypatch.setattr(ArchiveModel, '_build_archive', racing)
+    response = client.post(f"/api/tasks/{task['_id']}/archive")
+    assert response.status_code == 409
+
+
+def test_archive_stale_if_match_is_412(client, db, admin):
+    task = _task(db, admin)
+    db.tasks.update_one({}, {'$inc': {'version': 1}})
+    response = client.post(f"/api/tasks/{task['_id']}/archive", headers={'If-Match': '"0"'})
+    assert response.status_code == 412
+    assert db.tasks.count_documents({}) == 1
+
+
+class _Session:
+    """Stands in for a ClientSession on a replica set"""
+
+    def __init__(self):
+        self.transactions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def with_transaction(self, callback):
+        self.transactions += 1
+        # mongomock can't take a real session, so the writes run without one
+        return callback(None)
+
+
+def _archived(db):
+    collections, _ = ArchiveModel(db).partitions.route()
+    return [archive for collection in collections for archive in collection.find()]
+
+
+def test_archive_falls_back_without_transactions(db, admin):
+    # The conftest db answers start_session with code 20, as a standalone server does
+    task = _task(db, admin)
+    archive, original = ArchiveModel(db).archive_task(task['_id'], admin['_id'])
+    assert original['title'] == 'Task'
+    assert db.tasks.count_documents({}) == 0
+    assert [entry['task_id'] for entry in _archived(db)] == [task['_id']]
+
+
+def test_archive_tasks_falls_back_without_transactions(db, admin):
+    tasks = [_task(db, admin, title=f'Task {i}') for i in range(3)]
+    moved = ArchiveModel(db).archive_tasks(list(db.tasks.find()), admin['_id'])
+    assert len(moved) == 3
+    assert db.tasks.count_documents({}) == 0
+    assert sorted(entry['task_id'] for entry in _archived(db)) == sorted(task['_id'] for task in tasks)
+
+
+def test_archive_uses_a_transaction_when_available(db, admin):
+    session = _Session()
+    db.client.start_session = lambda: session
+    task = _task(db, admin)
+    assert ArchiveModel(db).archive_task(task['_id'], admin['_id'])
+    assert session.transactions == 1
+    assert db.tasks.count_documents({}) == 0
+
+
+def test_archive_raises_other_transaction_errors(db, admin):
+    def start_session():
+        raise OperationFailure('not primary', 10107)
+    db.client.start_session = start_session
+    task = _task(db, admin)
+    with pytest.raises(OperationFailure):
+        ArchiveModel(db).archive_task(task['_id'], admin['_id'])
+    assert db.tasks.count_documents({}) == 1
+    assert _archived(db) == []
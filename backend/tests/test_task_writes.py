@@ -0,0 +1,89 @@
+from models.task import Task, VersionConflict
+from utils.events import task_events
+
+
+def _task(db, admin, **fields):
+    return Task(db).create_task(dict({'title': 'Task', 'description': 'Details', 'department': 'CSE',
+                                      'created_by': admin['_id']}, **fields))
+
+
+def test_bulk_update_events_carry_the_stored_version(client, db, admin, monkeypatch):
+    task = _task(db, admin)
+    published = []
+    monkeypatch.setattr(task_events, 'publish', lambda event_type, summary: published.append(summary))
+
+    response = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'update', 'task_id': task['_id'], 'data': {'priority': 'high'}}
+    ]})
+    assert response.status_code == 200
+    stored = db.tasks.find_one()
+    assert response.json['results'][0]['version'] == stored['version']
+    assert [event['version'] for event in published] == [stored['version']]
+
+
+def _race_after_read(monkeypatch, method, change):
+    """Apply change to the database right after the route's read of the task(s)"""
+    read = getattr(Task, method)
+
+    def racing(self, *args, **kwargs):
+        result = read(self, *args, **kwargs)
+        change()
+        return result
+
+    monkeypatch.setattr(Task, method, racing)
+
+
+def test_update_with_stale_version_conflicts(client, db, admin):
+    task = _task(db, admin)
+    db.tasks.update_one({}, {'$set': {'priority': 'low'}, '$inc': {'version': 1}})
+
+    response = client.put(f"/api/tasks/{task['_id']}", json={'priority': 'high'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 412
+    assert response.json['version'] == 2
+    assert db.tasks.find_one()['priority'] == 'low'
+
+
+def test_update_with_current_version_applies(client, db, admin):
+    task = _task(db, admin)
+    response = client.put(f"/api/tasks/{task['_id']}", json={'priority': 'high'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+    assert db.tasks.find_one()['priority'] == 'high'
+
+
+def test_approve_requires_pending_approval_at_write_time(client, db, admin, monkeypatch):
+    task = _task(db, admin, status=Task.STATUS['PENDING_APPROVAL'])
+    # A reviewer sends the task back after the route saw it pending
+    _race_after_read(monkeypatch, 'get_task_by_id', lambda: db.tasks.update_one(
+        {}, {'$set': {'status': Task.STATUS['IN_PROGRESS']}, '$inc': {'version': 1}}
+    ))
+
+    response = client.post(f"/api/tasks/{task['_id']}/approve")
+    assert response.status_code == 409
+    assert db.tasks.find_one()['status'] == Task.STATUS['IN_PROGRESS']
+
+
+def test_approve_pending_task(client, db, admin):
+    task = _task(db, admin, status=Task.STATUS['PENDING_APPROVAL'])
+    response = client.post(f"/api/tasks/{task['_id']}/approve")
+    assert response.status_code == 200
+    assert db.tasks.find_one()['status'] == Task.STATUS['DONE']
+
+
+def test_bulk_update_tells_applied_ops_from_lost_ones(client, db, admin, monkeypatch):
+    kept = _task(db, admin, title='Kept')
+    raced = _task(db, admin, title='Raced')
+    _race_after_read(monkeypatch, 'get_tasks_by_ids', lambda: db.tasks.update_one(
+        {'title': 'Raced'}, {'$set': {'priority': 'low'}, '$inc': {'version': 1}}
+    ))
+
+    response = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'update', 'task_id': kept['_id'], 'data': {'priority': 'high'}},
+        {'op': 'update', 'task_id': raced['_id'], 'data': {'priority': 'high'}}
+    ]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert (results[0]['status'], results[0]['version']) == ('ok', 2)
+    assert (results[1]['status'], results[1]['error']) == ('error', str(VersionConflict()))
+    assert db.tasks.find_one({'title': 'Kept'})['priority'] == 'high'
+    assert db.tasks.find_one({'title': 'Raced'})['priority'] == 'low'
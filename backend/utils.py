@@ -1,2 +0,0 @@
-def has_permission(user, permission):
-    return permission in user.get('permissions', [])
@@ -0,0 +1 @@
+from .authorization import has_permission
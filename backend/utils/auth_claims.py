@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from bson import ObjectId
+from flask import current_app
+from flask_jwt_extended import get_jwt
+from pymongo.errors import PyMongoError
+from utils.authorization import mask_for_permissions
+
+logger = logging.getLogger(__name__)
+
+
+class AuthzVersionTable:
+    """Latest known authz_version per user, used to reject tokens with stale claims.
+
+    Bumps made in this process apply at once. Entries older than ttl seconds
+    are re-read from users.authz_version, so a bump made by another worker
+    or host is honoured within ttl.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._collection = None
+        self._versions = {}  # user_id -> (version, monotonic time it was known)
+        self._lock = threading.Lock()
+
+    def load(self, collection, ttl=None):
+        """Seed the table from users whose authorization has ever changed"""
+        self._collection = collection
+        if ttl is not None:
+            self.ttl = ttl
+        cursor = collection.find({'authz_version': {'$gt': 0}}, {'authz_version': 1})
+        for user in cursor:
+            self.set(str(user['_id']), user['authz_version'])
+
+    def set(self, user_id, version):
+        with self._lock:
+            known = self._versions.get(user_id)
+            self._versions[user_id] = (max(version, known[0]) if known else version, time.monotonic())
+
+    def _refresh(self, user_id):
+        try:
+            user = self._collection.find_one({'_id': ObjectId(user_id)}, {'authz_version': 1})
+        except PyMongoError as e:
+            # Keep answering from what is known rather than failing every request
+            logger.warning(f'Could not recheck authz_version for {user_id}: {e}')
+            return
+        self.set(user_id, (user or {}).get('authz_version') or 0)
+
+    def is_current(self, user_id, version):
+        known = self._versions.get(user_id)
+        if (self._collection is not None and ObjectId.is_valid(user_id)
+                and (known is None or time.monotonic() - known[1] > self.ttl)):
+            self._refresh(user_id)
+            known = self._versions.get(user_id)
+        return version >= (known[0] if known else 0)
+
+
+authz_versions = AuthzVersionTable()
+
+
+def claims_enabled():
+    return current_app.config.get('JWT_PERMISSION_CLAIMS', False)
+
+
+def build_claims(user, permissions):
+    """Authorization claims embedded in access tokens when claims mode is on"""
+    return {
+        'department': user.get('department'),
+        'roles': user.get('roles', []),
+        'permissions': sorted(permissions),
+        'permission_mask': mask_for_permissions(permissions),
+        'authz_version': user.get('authz_version', 0)
+    }
+
+
+def get_claims_user(user_id):
+    """Build the requesting user from verified token claims, or None if absent"""
+    if not claims_enabled():
+        return None
+    claims = get_jwt()
+    if 'authz_version' not in claims:
+        return None
+    return {
+        '_id': user_id,
+        'department': claims['department'],
+        'roles': claims['roles'],
+        'permissions': claims['permissions'],
+        'permission_mask': claims['permission_mask'],
+        'authz_version': claims['authz_version']
+    }
+
+
+def register_jwt_callbacks(jwt):
+    @jwt.token_in_blocklist_loader
+    def check_authz_version(jwt_header, jwt_payload):
+        # Tokens without claims are always checked against the database instead
+        version = jwt_payload.get('authz_version')
+        if version is None:
+            return False
+        return not authz_versions.is_current(jwt_payload['sub'], version)
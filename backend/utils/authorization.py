@@ -1,30 +1,109 @@
-from functools import wraps
-from flask import request, jsonify
-from models.user import UserModel  # Import your UserModel
-from models import db
-from models.user import MongoDB, UserModel, DepartmentModel,TaskModel
-
-
-
-# Assuming `db` is initialized elsewhere in your app
-def authorize(role_required=None, department_check=False):
-    def decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            email = request.headers.get('email')  # Assume email is in headers
-            user = UserModel(db).get_user_by_email(email)  # Use UserModel to fetch user
-            
-            if not user:
-                return jsonify({"message": "Unauthorized"}), 403
-            
-            if role_required and user['role'] not in role_required:
-                return jsonify({"message": "Forbidden"}), 403
-
-            if department_check:
-                department_id = kwargs.get('department_id')
-                if user['role'] == 'user' and user.get('department') != department_id:
-                    return jsonify({"message": "Access denied to this department"}), 403
-
-            return f(*args, **kwargs)
-        return wrapper
-    return decorator
+"""Compiled permission checks shared by all routes.
+
+The role table is compiled once at import into integer bitmasks, so a
+permission check is a single AND and role expansion is a dict lookup.
+"""
+
+# Bit order is fixed; append new permissions at the end
+PERMISSIONS = (
+    'manage_users', 'manage_roles', 'manage_departments',
+    'create_task', 'edit_task', 'delete_task', 'view_all_tasks',
+    'approve_task', 'generate_reports', 'generate_department_reports',
+    'access_archives', 'view_department_tasks', 'view_assigned_tasks'
+)
+
+PERMISSION_BITS = {name: 1 << bit for bit, name in enumerate(PERMISSIONS)}
+
+ROLE_PERMISSIONS = {
+    'super_admin': [
+        'manage_users', 'manage_roles', 'manage_departments',
+        'create_task', 'edit_task', 'delete_task', 'view_all_tasks',
+        'approve_task', 'generate_reports', 'access_archives',
+        'view_department_tasks', 'view_assigned_tasks'
+    ],
+    'admin': [
+        'manage_users', 'manage_roles',
+        'create_task', 'edit_task', 'view_all_tasks',
+        'approve_task', 'generate_reports', 'access_archives',
+        'view_department_tasks', 'view_assigned_tasks'
+    ],
+    'department_head': [
+        'create_task', 'edit_task', 'view_department_tasks',
+        'approve_task', 'generate_reports', 'generate_department_reports',
+        'view_assigned_tasks'
+    ],
+    'faculty': [
+        'create_task', 'edit_task', 'view_department_tasks',
+        'approve_task', 'generate_reports', 'view_assigned_tasks'
+    ],
+    'staff': [
+        'create_task', 'edit_task', 'view_assigned_tasks',
+        'generate_reports'
+    ]
+}
+
+# Fields that make a user the owner of a document, per document kind
+OWNER_FIELDS = {
+    'task': ('created_by', 'assigned_to'),
+    'report': ('generated_by',)
+}
+
+
+def mask_for_permissions(permissions):
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS.get(permission, 0)
+    return mask
+
+
+ROLE_MASKS = {role: mask_for_permissions(perms) for role, perms in ROLE_PERMISSIONS.items()}
+
+
+def mask_for_roles(roles):
+    mask = 0
+    for role in roles:
+        mask |= ROLE_MASKS.get(role, 0)
+    return mask
+
+
+def permissions_for_mask(mask):
+    return [name for name in PERMISSIONS if mask & PERMISSION_BITS[name]]
+
+
+def user_mask(user):
+    """Permission mask of a user, precomputed by the user cache when available"""
+    mask = user.get('permission_mask')
+    if mask is None:
+        mask = mask_for_permissions(user.get('permissions', []))
+    return mask
+
+
+def has_permission(user, permission):
+    return bool(user_mask(user) & PERMISSION_BITS.get(permission, 0))
+
+
+def filter_visible(user, documents, kind='task'):
+    """Return the tasks or reports the user may see, in their original order.
+
+    A document is visible with view_all_tasks, when it belongs to the user's
+    department, or when the user owns it (see OWNER_FIELDS).
+    """
+    if has_permission(user, 'view_all_tasks'):
+        return list(documents)
+
+    user_id = str(user['_id'])
+    department = user.get('department')
+    owner_fields = OWNER_FIELDS[kind]
+    return [
+        document for document in documents
+        if document.get('department') == department
+        or any(document.get(field) == user_id for field in owner_fields)
+    ]
+
+
+def can_view(user, document, kind='task'):
+    return bool(filter_visible(user, [document], kind))
+
+
+def can_edit_task(user, task):
+    return has_permission(user, 'edit_task') and can_view(user, task, 'task')
@@ -0,0 +1,196 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Task statuses that can no longer become overdue
+CLOSED_STATUSES = ('done', 'archived')
+
+
+def parse_due(value):
+    """When a due_date passes, as naive UTC; a bare YYYY-MM-DD is due at the end of that day"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+        if len(value) == 10:
+            parsed += timedelta(days=1)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def is_overdue(due_date, status, now=None):
+    due_at = parse_due(due_date)
+    return bool(due_at and status not in CLOSED_STATUSES and due_at <= (now or datetime.utcnow()))
+
+
+class DueDateScheduler:
+    """Marks tasks overdue as their due dates pass and keeps per-department overdue counts.
+
+    Upcoming due dates sit in a min-heap and a daemon thread sleeps until the
+    earliest one. Entries are invalidated lazily: a popped entry only fires if
+    it still matches _pending for its task. Task writes in this process call
+    track(); a periodic resync picks up writes made by other processes.
+    """
+
+    def __init__(self, resync_interval=900):
+        self.resync_interval = resync_interval
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pending = {}  # task_id -> (due_at, due_date as stored)
+        self._overdue = {}  # task_id -> department
+        self._counts = Counter()
+        self._collection = None
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, collection, resync_interval=None):
+        if self._thread:
+            return
+        if resync_interval is not None:
+            self.resync_interval = resync_interval
+        self._collection = collection
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='due-date-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def overdue_count(self, department):
+        with self._cond:
+            return self._counts.get(department, 0)
+
+    def overdue_counts(self):
+        with self._cond:
+            return {department: count for department, count in self._counts.items() if count}
+
+    def resync(self):
+        """Rebuild the heap and counts from the database"""
+        open_query = {'status': {'$nin': list(CLOSED_STATUSES)}}
+        overdue = {
+            str(task['_id']): task.get('department')
+            for task in self._collection.find(dict(open_query, overdue=True), {'department': 1})
+        }
+        pending = {}
+        for task in self._collection.find(
+                dict(open_query, due_date={'$nin': [None, '']}, overdue={'$ne': True}), {'due_date': 1}):
+            due_at = parse_due(task['due_date'])
+            if due_at:
+                pending[str(task['_id'])] = (due_at, task['due_date'])
+
+        with self._cond:
+            self._overdue = overdue
+            self._counts = Counter(overdue.values())
+            self._pending = pending
+            self._heap = [(due_at, task_id) for task_id, (due_at, _) in pending.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def track(self, task):
+        """Bring the schedule in line with a task as it was just written"""
+        if not self.running:
+            return
+        task_id = str(task['_id'])
+        closed = task.get('status') in CLOSED_STATUSES
+        with self._cond:
+            self._set_overdue(task_id, task.get('department') if task.get('overdue') and not closed else None)
+            due_at = None if closed or task.get('overdue') else parse_due(task.get('due_date'))
+            if due_at is None:
+                self._pending.pop(task_id, None)
+                return
+            self._pending[task_id] = (due_at, task['due_date'])
+            heapq.heappush(self._heap, (due_at, task_id))
+            if self._heap[0][1] == task_id:
+                self._cond.notify()
+
+    def _set_overdue(self, task_id, department):
+        previous = self._overdue.get(task_id)
+        if task_id in self._overdue and previous == department:
+            return
+        if task_id in self._overdue:
+            self._counts[previous] -= 1
+            del self._overdue[task_id]
+        if department is not None:
+            self._overdue[task_id] = department
+            self._counts[department] += 1
+
+    def _due_entries(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, task_id = heapq.heappop(self._heap)
+            entry = self._pending.get(task_id)
+            if entry and entry[0] == due_at:
+                del self._pending[task_id]
+                due.append((task_id, entry[1]))
+        return due
+
+    def _mark_overdue(self, due):
+        # The stored due_date guards against the task having been rescheduled elsewhere
+        requests = [
+            UpdateOne(
+                {'_id': ObjectId(task_id), 'due_date': due_date,
+                 'status': {'$nin': list(CLOSED_STATUSES)}, 'overdue': {'$ne': True}},
+                {'$set': {'overdue': True}, '$inc': {'version': 1}}
+            )
+            for task_id, due_date in due
+        ]
+        self._collection.bulk_write(requests, ordered=False)
+        marked = self._collection.find(
+            {'_id': {'$in': [ObjectId(task_id) for task_id, _ in due]}, 'overdue': True,
+             'status': {'$nin': list(CLOSED_STATUSES)}},
+            {'department': 1}
+        )
+        marked = [(str(task['_id']), task.get('department')) for task in marked]
+        with self._cond:
+            for task_id, department in marked:
+                self._set_overdue(task_id, department)
+
+    def _run(self):
+        next_resync = 0
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = datetime.utcnow()
+                due = self._due_entries(now)
+                if not due and next_resync > time.monotonic():
+                    timeout = next_resync - time.monotonic()
+                    if self._heap:
+                        timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+                    self._cond.wait(max(timeout, 0))
+                    continue
+            try:
+                if due:
+                    self._mark_overdue(due)
+                if next_resync <= time.monotonic():
+                    self.resync()
+                    next_resync = time.monotonic() + self.resync_interval
+            except PyMongoError as e:
+                logger.error(f"Due date scheduler failed: {e}")
+                next_resync = time.monotonic() + self.resync_interval
+
+
+due_date_scheduler = DueDateScheduler()
@@ -0,0 +1,51 @@
+import calendar
+
+
+def version_etag(version):
+    """Strong ETag for a document version counter"""
+    return f'"{version or 0}"'
+
+
+def timestamp_etag(timestamp):
+    """Strong ETag for a document's last-modified time, at the millisecond precision Mongo stores"""
+    if not timestamp:
+        return '"0"'
+    millis = calendar.timegm(timestamp.utctimetuple()) * 1000 + timestamp.microsecond // 1000
+    return f'"t{millis}"'
+
+
+def parse_if_match(header):
+    """Version number from an If-Match header, or None when absent or '*'.
+
+    Raises ValueError for a malformed header.
+    """
+    if not header or header.strip() == '*':
+        return None
+    value = header.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    return int(value.strip('"'))
+
+
+def if_none_match(header, etag):
+    """True when an If-None-Match header matches etag (weak comparison, as RFC 9110 asks for GET)"""
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_headers(etag):
+    """Headers for a private, always-revalidated response"""
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+
+def not_modified(etag):
+    return '', 304, cache_headers(etag)
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+from collections import deque
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One listener's queue of events; overflowed is set when it falls too far behind"""
+
+    def __init__(self, bus, accept, max_queue):
+        self._bus = bus
+        self.accept = accept
+        self.overflowed = False
+        self._queue = queue.Queue(max_queue)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or None after timeout seconds without one"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class LocalBroker:
+    """Delivers events to subscribers in this process only"""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, event):
+        self._deliver(event)
+
+    def stop(self):
+        pass
+
+
+class MongoBroker:
+    """Fans events out to every process through a capped collection each process tails"""
+
+    def __init__(self, db, name='task_events', size=16 * 1024 * 1024):
+        try:
+            db.create_collection(name, capped=True, size=size)
+        except CollectionInvalid:
+            pass
+        self.collection = db[name]
+        self._stopping = threading.Event()
+
+    def start(self, deliver):
+        self._deliver = deliver
+        threading.Thread(target=self._tail, name='task-events-tail', daemon=True).start()
+
+    def publish(self, event):
+        self.collection.insert_one({'_id': ObjectId(event['id']), 'event': event})
+
+    def stop(self):
+        self._stopping.set()
+
+    def _tail(self):
+        # Start after whatever is already there; only new events are delivered
+        latest = self.collection.find_one(sort=[('$natural', -1)])
+        last_id = latest['_id'] if latest else None
+        while not self._stopping.is_set():
+            try:
+                query = {'_id': {'$gt': last_id}} if last_id else {}
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive and not self._stopping.is_set():
+                    for document in cursor:
+                        last_id = document['_id']
+                        self._deliver(document['event'])
+            except PyMongoError as e:
+                logger.error(f"Task event tail failed: {e}")
+            # A tailable cursor dies on an empty collection; wait before reopening it
+            self._stopping.wait(1)
+
+
+class EventBus:
+    """In-process pub/sub for change events, with a short replay buffer for reconnects.
+
+    Publishers hand events to the broker, which delivers them back to every
+    process's bus; each bus fans out to its subscribers' queues. Subscribers
+    block on their queue, so idle listeners do no work.
+    """
+
+    def __init__(self, replay_size=1000, queue_size=256):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=replay_size)
+        self._broker = LocalBroker()
+        self._broker.start(self._deliver)
+
+    def set_broker(self, broker):
+        self._broker.stop()
+        broker.start(self._deliver)
+        self._broker = broker
+
+    def publish(self, event_type, document):
+        event = {'id': str(ObjectId()), 'type': event_type, 'data': document}
+        try:
+            self._broker.publish(event)
+        except Exception:
+            # A lost notification must never fail the write that caused it
+            logger.exception(f"Failed to publish {event_type} event")
+
+    def subscribe(self, accept, last_event_id=None):
+        """Register a listener for events whose data passes accept().
+
+        With last_event_id, events still in the replay buffer after that one
+        are queued first.
+        """
+        subscription = Subscription(self, accept, self.queue_size)
+        with self._lock:
+            if last_event_id:
+                ids = [event['id'] for event in self._recent]
+                if last_event_id in ids:
+                    for event in list(self._recent)[ids.index(last_event_id) + 1:]:
+                        if accept(event['data']):
+                            subscription.put(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _deliver(self, event):
+        with self._lock:
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.accept(event['data']):
+                subscription.put(event)
+
+
+task_events = EventBus()
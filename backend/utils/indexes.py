@@ -0,0 +1,57 @@
+import logging
+import threading
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_indexes(db, registry):
+    """Create declared indexes that are missing and report undeclared or unused ones.
+
+    registry maps a collection name to the list of IndexModel objects its
+    model declares. Returns a summary dict per collection.
+    """
+    report = {}
+    for collection_name, indexes in registry.items():
+        collection = db[collection_name]
+        declared = {index.document['name'] for index in indexes}
+        existing = set(collection.index_information())
+        missing = [index for index in indexes if index.document['name'] not in existing]
+        summary = {'created': [], 'failed': [], 'undeclared': [], 'unused': []}
+
+        for index in missing:
+            name = index.document['name']
+            try:
+                collection.create_indexes([index])
+                summary['created'].append(name)
+            except PyMongoError as e:
+                summary['failed'].append(name)
+                logger.error(f"Failed to create index {collection_name}.{name}: {e}")
+
+        summary['undeclared'] = sorted(existing - declared - {'_id_'})
+
+        # Access counters reset when mongod restarts, so "unused" is a hint, not proof
+        try:
+            for stats in collection.aggregate([{'$indexStats': {}}]):
+                if stats['name'] in declared and stats['accesses']['ops'] == 0:
+                    summary['unused'].append(stats['name'])
+        except PyMongoError:
+            pass
+
+        if summary['created']:
+            logger.info(f"Created indexes on {collection_name}: {', '.join(summary['created'])}")
+        if summary['undeclared']:
+            logger.warning(f"Undeclared indexes on {collection_name}: {', '.join(summary['undeclared'])}")
+        if summary['unused']:
+            logger.info(f"Unused indexes on {collection_name}: {', '.join(summary['unused'])}")
+        report[collection_name] = summary
+    return report
+
+
+def reconcile_indexes_async(db, registry):
+    """Reconcile indexes on a daemon thread so startup isn't blocked by index builds"""
+    thread = threading.Thread(
+        target=reconcile_indexes, args=(db, registry), name='index-reconciler', daemon=True
+    )
+    thread.start()
+    return thread
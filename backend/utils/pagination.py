@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Keyset order shared by every paginated list: newest first, _id breaks ties
+PAGE_SORT = [('created_at', -1), ('_id', -1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(document, field='created_at'):
+    """Opaque cursor pointing just after the given document"""
+    key = [document[field].isoformat(), str(document['_id'])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    try:
+        timestamp, object_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId):
+        raise InvalidCursor('Invalid cursor')
+
+
+def keyset_filter(after, field='created_at'):
+    """Query matching documents that sort after the (field, _id) key"""
+    timestamp, object_id = after
+    return {'$or': [
+        {field: {'$lt': timestamp}},
+        {field: timestamp, '_id': {'$lt': object_id}}
+    ]}
+
+
+def parse_page_args(args):
+    """Read limit/cursor from request args; returns (limit, after) or (None, None)"""
+    if 'limit' not in args and 'cursor' not in args:
+        return None, None
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidCursor('Invalid limit')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cursor = args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def page_response(items, limit, key, field='created_at'):
+    """Page envelope; next_cursor is set whenever the page came back full"""
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor(items[-1], field)
+    return {key: items, 'next_cursor': next_cursor}
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many password operations are already queued"""
+
+
+class PasswordHasher:
+    """Runs bcrypt work on a bounded thread pool and sheds load when it is full.
+
+    bcrypt releases the GIL, so the pool caps how many CPU-bound hashes run at
+    once while other requests keep being served; callers beyond max_pending are
+    rejected immediately instead of piling up behind a login storm. Bulk
+    work gets at most half the workers, so logins always find capacity.
+    """
+
+    def __init__(self, rounds=12, workers=4, max_pending=32):
+        self._executor = None
+        self._slots = None
+        self._bulk_slots = None
+        self.configure(rounds, workers, max_pending)
+
+    def configure(self, rounds, workers, max_pending):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._bulk_slots = threading.BoundedSemaphore(max(1, workers // 2))
+
+    def _submit(self, fn, *args, blocking=False):
+        slots = self._slots
+        if not slots.acquire(blocking=blocking):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        return self._submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(self._hash, password, self.rounds)
+
+    def hash_many(self, passwords):
+        """Hash a batch in parallel across the pool (used by bulk imports).
+
+        Each hash waits for a bulk slot and then a pending slot instead of
+        being rejected. Only half the workers' worth of bulk hashes is ever
+        pending, so a large batch can't crowd logins out of the pool.
+        """
+        futures = []
+        for password in passwords:
+            bulk_slots = self._bulk_slots
+            bulk_slots.acquire()
+            try:
+                future = self._submit(self._hash, password, self.rounds, blocking=True)
+            except Exception:
+                bulk_slots.release()
+                raise
+            future.add_done_callback(lambda _: bulk_slots.release())
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def check(self, password, hashed):
+        return self._run(self._check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        """True when the stored hash was made with a different cost factor"""
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        try:
+            return int(hashed.split(b'$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    @staticmethod
+    def _hash(password, rounds):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds))
+
+    @staticmethod
+    def _check(password, hashed):
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+
+
+password_hasher = PasswordHasher()
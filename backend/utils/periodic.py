@@ -0,0 +1,23 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def run_periodically(name, interval, job, run_first=True):
+    """Call job() every interval seconds on a daemon thread; set the returned event to stop"""
+    stopped = threading.Event()
+
+    def loop():
+        if not run_first and stopped.wait(interval):
+            return
+        while True:
+            try:
+                job()
+            except Exception:
+                logger.exception(f"Periodic job {name} failed")
+            if stopped.wait(interval):
+                return
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+    return stopped
@@ -0,0 +1,73 @@
+import html
+import re
+
+SNIPPET_WIDTH = 160
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token.lower() for token in _WORD.findall(text or '')]
+
+
+def _stem(word):
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _matches(word, stems):
+    word = _stem(word.lower())
+    for stem in stems:
+        if word == stem:
+            return True
+        if min(len(word), len(stem)) >= 3 and (word.startswith(stem) or stem.startswith(word)):
+            return True
+    return False
+
+
+def highlight(text, terms, width=SNIPPET_WIDTH):
+    """HTML-escaped snippet of text around the first matching term, with matches in <mark>.
+
+    Words are compared on a crude suffix-stripped stem, which approximates the
+    stemming the text index applies. Returns None when nothing matches.
+    """
+    if not text or not terms:
+        return None
+    if not isinstance(text, str):
+        text = ' '.join(str(part) for part in text)
+
+    matches = [m for m in _WORD.finditer(text) if _matches(m.group(), terms)]
+    if not matches:
+        return None
+
+    start = max(0, matches[0].start() - width // 4)
+    end = min(len(text), start + width)
+    pieces = []
+    position = start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        pieces.append(html.escape(text[position:match.start()]))
+        pieces.append(f'<mark>{html.escape(match.group())}</mark>')
+        position = match.end()
+    pieces.append(html.escape(text[position:end]))
+
+    snippet = ''.join(pieces)
+    if start > 0:
+        snippet = '…' + snippet
+    if end < len(text):
+        snippet += '…'
+    return snippet
+
+
+def highlight_document(document, query, fields):
+    """Map of field -> highlighted snippet for the fields that match the query"""
+    terms = [_stem(token) for token in tokenize(query)]
+    highlights = {}
+    for field in fields:
+        snippet = highlight(document.get(field), terms)
+        if snippet:
+            highlights[field] = snippet
+    return highlights
@@ -0,0 +1,162 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from urllib.parse import quote
+import bson
+from bson import ObjectId
+
+# Index entry: 12-byte ObjectId, then the record's offset and length in the segment file
+_ENTRY = struct.Struct('>12sQI')
+
+
+class SegmentUnavailable(Exception):
+    """A segment file is missing, unreadable or corrupt"""
+
+
+class SegmentStore:
+    """Immutable cold-tier segment files for archive entries, on local disk.
+
+    A segment is a run of zlib-compressed BSON records (<name>.seg) plus an
+    index of fixed-size entries sorted by _id (<name>.idx). Reads binary
+    search the memory-mapped index and fetch the record with one pread, so a
+    lookup touches a few index pages and a single extent of the segment.
+    Open segments are kept in a small LRU.
+    """
+
+    def __init__(self, root='archive_segments', max_open=64):
+        self.root = root
+        self.max_open = max_open
+        self._open = OrderedDict()  # name -> (index mmap, segment fd)
+        self._lock = threading.Lock()
+
+    def configure(self, root, max_open=None):
+        with self._lock:
+            self._close_all()
+            self.root = root
+            if max_open is not None:
+                self.max_open = max_open
+
+    def _path(self, name, suffix):
+        return os.path.join(self.root, name + suffix)
+
+    def _create_segment(self, department, month):
+        """Claim the next unused generation for department and month; returns (name, open fd)"""
+        directory = quote(str(department), safe='')
+        os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        # Segments never change, so a later export of the same month gets the next generation.
+        # O_EXCL makes the claim atomic even between processes.
+        generation = 0
+        while True:
+            name = f'{directory}/{month}.{generation}'
+            try:
+                return name, os.open(self._path(name, '.seg'), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                generation += 1
+
+    def _write_chunks(self, fd, chunks):
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def write(self, department, month, documents):
+        """Pack documents into a new segment for department and month (YYYY-MM).
+
+        Returns the segment name and the _ids written. The index is linked
+        into place last, so a segment only becomes readable once complete,
+        and an existing index is never replaced.
+        """
+        name, fd = self._create_segment(department, month)
+        entries = []
+        offset = 0
+
+        def records():
+            nonlocal offset
+            for document in documents:
+                record = zlib.compress(bson.encode(document))
+                entries.append((document['_id'].binary, offset, len(record)))
+                offset += len(record)
+                yield record
+
+        self._write_chunks(fd, records())
+        if not entries:
+            os.remove(self._path(name, '.seg'))
+            return None, []
+        entries.sort()
+        tmp = self._path(name, f'.idx.{os.getpid()}.{threading.get_ident()}.tmp')
+        self._write_chunks(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644),
+                           (_ENTRY.pack(*entry) for entry in entries))
+        try:
+            # link() fails instead of overwriting when the index already exists
+            os.link(tmp, self._path(name, '.idx'))
+        finally:
+            os.remove(tmp)
+        return name, [ObjectId(key) for key, _, _ in entries]
+
+    def drop_before(self, month):
+        """Delete every department's segments for months before month (YYYY-MM)"""
+        with self._lock:
+            for name in [name for name in self._open if name.split('/')[-1][:7] < month]:
+                self._close(*self._open.pop(name))
+            for path in glob.glob(os.path.join(glob.escape(self.root), '*', '*.*')):
+                if os.path.basename(path)[:7] < month:
+                    os.remove(path)
+
+    def _segment(self, name):
+        if name in self._open:
+            self._open.move_to_end(name)
+            return self._open[name]
+        with open(self._path(name, '.idx'), 'rb') as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fd = os.open(self._path(name, '.seg'), os.O_RDONLY)
+        self._open[name] = (index, fd)
+        while len(self._open) > self.max_open:
+            self._close(*self._open.popitem(last=False)[1])
+        return index, fd
+
+    def _close(self, index, fd):
+        index.close()
+        os.close(fd)
+
+    def _close_all(self):
+        while self._open:
+            self._close(*self._open.popitem()[1])
+
+    def read(self, name, document_id):
+        """The document with document_id from segment name, or None.
+
+        Raises SegmentUnavailable when the segment can't be read.
+        """
+        key = ObjectId(document_id).binary
+        try:
+            return self._read(name, key)
+        except (OSError, ValueError, zlib.error, bson.errors.BSONError) as e:
+            raise SegmentUnavailable(f'Segment {name} is unavailable: {e}') from e
+
+    def _read(self, name, key):
+        # Held throughout so an evicted segment isn't closed mid-read; cold reads are rare
+        with self._lock:
+            index, fd = self._segment(name)
+            low, high = 0, len(index) // _ENTRY.size
+            while low < high:
+                middle = (low + high) // 2
+                start = middle * _ENTRY.size
+                if index[start:start + 12] < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            start = low * _ENTRY.size
+            if start >= len(index) or index[start:start + 12] != key:
+                return None
+            _, offset, length = _ENTRY.unpack_from(index, start)
+            record = os.pread(fd, length, offset)
+        return bson.decode(zlib.decompress(record))
+
+
+# Shared by every request handled in this process
+archive_segments = SegmentStore()
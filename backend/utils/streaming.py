@@ -0,0 +1,40 @@
+from itertools import islice
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def batched(iterable, size):
+    """Lists of up to size items from iterable, consumed lazily"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def wants_expand(name):
+    """True when ?expand= (comma-separated) asks for name"""
+    return name in request.args.get('expand', '').split(',')
+
+
+def wants_ndjson():
+    """True when the client prefers newline-delimited JSON over a JSON array"""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def ndjson_response(documents):
+    """Stream documents one JSON line at a time as they come off the cursor"""
+    def generate():
+        for document in documents:
+            yield current_app.json.dumps(document) + '\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def list_response(documents):
+    """NDJSON stream when requested, otherwise the usual JSON array"""
+    if wants_ndjson():
+        return ndjson_response(documents)
+    return current_app.json.response(list(documents))
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+
+
+class UserCache:
+    """Process-level LRU cache of user documents with a per-entry TTL"""
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_size, ttl):
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every request handled in this process
+user_cache = UserCache()
+
+
+def _request_users():
+    if not has_app_context():
+        return None
+    if '_user_cache' not in g:
+        g._user_cache = {}
+    return g._user_cache
+
+
+def get_request_user(user_id):
+    users = _request_users()
+    return users.get(user_id) if users is not None else None
+
+
+def set_request_user(user_id, user):
+    users = _request_users()
+    if users is not None:
+        users[user_id] = user
+
+
+def invalidate_user(user_id):
+    """Drop a user from both the request-scoped and process-level caches"""
+    user_id = str(user_id)
+    users = _request_users()
+    if users is not None:
+        users.pop(user_id, None)
+    user_cache.invalidate(user_id)